@@ -0,0 +1,247 @@
+"""
+Compiled form of the synthesized controller.
+
+load_dot gives for each node a list of (ins_cond, outs_signal, node_to) where
+ins_cond uses -1 for don't care. Here every guard is packed into a care mask
+and a value mask (bit i is input i) and each node gets a dense table indexed
+by the input bit vector, so a step is a single list lookup.
+
+export() writes the controller once into a compact binary file and load()
+memory-maps it, so starting a player needs no parsing and processes on the
+same host share one read-only copy.
+"""
+import array
+import mmap
+import struct
+import sys
+
+
+def pack(ins_v):
+    """
+    pack input vector to int, bit i is ins_v[i]
+
+    >>> pack([1, 0, 1, 1])
+    13
+    """
+    x = 0
+    for i, v in enumerate(ins_v):
+        if v == 1:
+            x |= 1 << i
+    return x
+
+
+def guard(ins_cond):
+    """
+    return (care, value) masks of ins_cond, input x matches if x & care == value
+
+    >>> guard([1, -1, 0, 1])
+    (13, 9)
+    """
+    care = 0
+    value = 0
+    for i, v in enumerate(ins_cond):
+        if v != -1:
+            care |= 1 << i
+            if v == 1:
+                value |= 1 << i
+    return care, value
+
+
+def inputs(care, value, n_ins):
+    """
+    iterate all input bit vectors matching the guard
+
+    >>> sorted(inputs(*guard([1, -1, 0]), 3))
+    [1, 3]
+    """
+    free = ((1 << n_ins) - 1) & ~care
+    sub = free
+    while True:
+        yield value | sub
+        if sub == 0:
+            break
+        sub = (sub - 1) & free
+
+
+class Table(object):
+    """
+    Dense transition table.
+
+    next_node[node << n_ins | x] is the node after reading input x at node (-1 if no edge),
+    outs[node << n_ins | x] is the output signal of that edge.
+    """
+    def __init__(self, n_ins, next_node, outs, start=0):
+        self.n_ins = n_ins
+        self.next_node = next_node
+        self.outs = outs
+        self.start = start
+
+    @property
+    def n_nodes(self):
+        return len(self.next_node) >> self.n_ins
+
+    def step(self, cur, x):
+        """
+        return (node_to, outs_signal) for input bit vector x, or None if x breaks the assumption
+        """
+        i = cur << self.n_ins | x
+        node_to = self.next_node[i]
+        if node_to < 0:
+            return None
+        return node_to, self.outs[i]
+
+
+def compile_graph(graph, n_ins, start=0):
+    """
+    compile graph from load_dot into a Table.
+    if several edges match an input the first one wins, same as scanning graph[cur].
+
+    >>> t = compile_graph({0: [([1, -1], [1], 1), ([-1, -1], [0], 0)], 1: [([0, 0], [1], 0)]}, 2)
+    >>> t.step(0, pack([1, 1])), t.step(0, pack([0, 1])), t.step(1, pack([0, 0])), t.step(1, pack([0, 1]))
+    ((1, (1,)), (0, (0,)), (0, (1,)), None)
+    """
+    nodes = set(graph)
+    for edges in graph.values():
+        nodes.update(node_to for _, _, node_to in edges)
+    n_nodes = max(nodes) + 1 if nodes else 0
+    width = 1 << n_ins
+    next_node = [-1] * (n_nodes * width)
+    outs = [None] * (n_nodes * width)
+    signals = {}
+    for node_from, edges in graph.items():
+        base = node_from * width
+        for ins_cond, outs_signal, node_to in edges:
+            sig = tuple(outs_signal)
+            sig = signals.setdefault(sig, sig)
+            for x in inputs(*guard(ins_cond), n_ins):
+                if next_node[base + x] < 0:
+                    next_node[base + x] = node_to
+                    outs[base + x] = sig
+    return Table(n_ins, next_node, outs, start)
+
+
+# binary format, native byte order, every section is 8 byte aligned
+#   header   : magic, version, n_ins, n_outs, n_nodes, n_edges, start, dense
+#   offsets  : uint32[n_nodes + 1], edges of node i are offsets[i]..offsets[i+1]
+#   care     : uint32[n_edges]  guard masks
+#   value    : uint32[n_edges]
+#   target   : uint32[n_edges]
+#   out_care : uint64[n_edges]  output words, bit j is outs_signal[j], don't care has no care bit
+#   out_value: uint64[n_edges]
+#   dispatch : int32[n_nodes << n_ins] edge index for each (node, input), only if dense
+MAGIC = b'ELVA'
+VERSION = 1
+HEADER = struct.Struct('=4s7I')
+DENSE_MAX_INS = 16
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def export(graph, n_ins, fname, start=0):
+    """
+    write graph from load_dot to binary file fname
+    """
+    n_nodes = 0
+    n_outs = 0
+    for node_from, edges in graph.items():
+        n_nodes = max(n_nodes, node_from + 1)
+        for _, outs_signal, node_to in edges:
+            n_nodes = max(n_nodes, node_to + 1)
+            n_outs = max(n_outs, len(outs_signal))
+    assert n_ins <= 32 and n_outs <= 64
+    dense = n_ins <= DENSE_MAX_INS
+
+    offsets = array.array('I', [0])
+    care, value, target = array.array('I'), array.array('I'), array.array('I')
+    out_care, out_value = array.array('Q'), array.array('Q')
+    dispatch = array.array('i', [-1]) * ((n_nodes << n_ins) if dense else 0)
+    for node in range(n_nodes):
+        for ins_cond, outs_signal, node_to in graph.get(node, []):
+            c, v = guard(ins_cond)
+            oc, ov = guard(outs_signal)
+            if dense:
+                for x in inputs(c, v, n_ins):
+                    i = node << n_ins | x
+                    if dispatch[i] < 0:
+                        dispatch[i] = len(target)
+            care.append(c)
+            value.append(v)
+            target.append(node_to)
+            out_care.append(oc)
+            out_value.append(ov)
+        offsets.append(len(target))
+
+    with open(fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n_ins, n_outs, n_nodes, len(target), start, int(dense)))
+        for a in (offsets, care, value, target, out_care, out_value, dispatch):
+            b = a.tobytes()
+            f.write(b)
+            f.write(bytes(_align(len(b)) - len(b)))
+
+
+class MappedTable(object):
+    """
+    Transition table backed by a memory-mapped file written by export().
+    Same step() as Table.
+    """
+    def __init__(self, fname):
+        with open(fname, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_ins, self.n_outs, self.n_nodes, n_edges, self.start, dense = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{0} is not an automaton file'.format(fname))
+        buf = memoryview(self.mm)
+        pos = HEADER.size
+
+        def section(fmt, n):
+            nonlocal pos
+            size = n * struct.calcsize(fmt)
+            a = buf[pos:pos + size].cast(fmt)
+            pos += _align(size)
+            return a
+
+        self.offsets = section('I', self.n_nodes + 1)
+        self.care = section('I', n_edges)
+        self.value = section('I', n_edges)
+        self.target = section('I', n_edges)
+        self.out_care = section('Q', n_edges)
+        self.out_value = section('Q', n_edges)
+        self.dispatch = section('i', self.n_nodes << self.n_ins) if dense else None
+        self.signals = {}
+
+    def signal(self, e):
+        """
+        outs_signal of edge e as in load_dot, -1 is don't care
+        """
+        sig = self.signals.get(e)
+        if sig is None:
+            oc, ov = self.out_care[e], self.out_value[e]
+            sig = tuple((ov >> j) & 1 if (oc >> j) & 1 else -1 for j in range(self.n_outs))
+            self.signals[e] = sig
+        return sig
+
+    def step(self, cur, x):
+        if self.dispatch is not None:
+            e = self.dispatch[cur << self.n_ins | x]
+            if e < 0:
+                return None
+        else:
+            for e in range(self.offsets[cur], self.offsets[cur + 1]):
+                if x & self.care[e] == self.value[e]:
+                    break
+            else:
+                return None
+        return self.target[e], self.signal(e)
+
+
+def load(fname):
+    return MappedTable(fname)
+
+
+if __name__ == '__main__':
+    import kiss
+    from demo4_play import load_dot
+    graph = load_dot(sys.argv[1])
+    export(graph, kiss.n_inputs(graph), sys.argv[2])
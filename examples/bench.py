@@ -0,0 +1,208 @@
+"""
+Benchmark every stage of the pipeline and compare with a recorded baseline.
+
+Stages: building the guarantees, make_spec, strix, writing the DOT file,
+dot -Tsvg, load_dot and per-step dispatch of the player. For each stage the
+wall time and cpu time of this process and of child processes (from getrusage)
+are recorded. Memory is the peak of python allocations of the stage (one
+more run under tracemalloc), for strix and dot the peak RSS of that process.
+
+    python examples/bench.py --save      # record examples/bench_baseline.json
+    python examples/bench.py             # compare, exit 1 on regression
+
+When strix or graphviz is not installed those stages are skipped and the
+later stages use the shipped demo4_4f.dot.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import automaton
+import demo4
+import demo4_play
+import kiss
+import strix
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, 'bench_baseline.json')
+
+# stage is a regression if it is slower than baseline * (1 + threshold) and by at least MIN_DIFF seconds
+THRESHOLD = 0.2
+MIN_DIFF = 0.005
+MIN_MEM_DIFF = 2 ** 20
+
+
+def measure(fn, repeat=1, trace_memory=True):
+    """
+    run fn repeat times, return (last result, measurement of the fastest run).
+    if trace_memory, fn first runs once more under tracemalloc for 'mem', the peak of its allocations.
+    """
+    mem = None
+    if trace_memory:
+        # ru_maxrssはプロセス全体の最大値なので段階ごとの比較に使えない.
+        # 最初に測る(2回目以降はLTLの共有部分が作られていて少なく見える)
+        tracemalloc.start()
+        try:
+            fn()
+            mem = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        self0 = resource.getrusage(resource.RUSAGE_SELF)
+        child0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        t0 = time.perf_counter()
+        res = fn()
+        wall = time.perf_counter() - t0
+        self1 = resource.getrusage(resource.RUSAGE_SELF)
+        child1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        m = {
+            'wall': wall,
+            'cpu': (self1.ru_utime - self0.ru_utime) + (self1.ru_stime - self0.ru_stime),
+            'child_cpu': (child1.ru_utime - child0.ru_utime) + (child1.ru_stime - child0.ru_stime),
+        }
+        if best is None or m['wall'] < best['wall']:
+            best = m
+    if mem is not None:
+        best['mem'] = mem
+    return res, best
+
+
+def run_stages(N, M, TL, steps, repeat, workdir):
+    results = {}
+
+    def stage(name, fn, n=repeat, child=False):
+        """
+        fn of a child stage runs one process and returns (result, peak RSS of the process)
+        """
+        res, m = measure(fn, n, trace_memory=not child)
+        if child:
+            res, m['child_maxrss'] = res
+            mem = 'child maxrss {0:7.1f}MB'.format(m['child_maxrss'] / 2 ** 20)
+        else:
+            mem = 'mem {0:7.1f}MB'.format(m['mem'] / 2 ** 20)
+        results[name] = m
+        print('{0:10s} {wall:9.4f}s  cpu {cpu:8.4f}s  child cpu {child_cpu:8.4f}s  {1}'.format(name, mem, **m), flush=True)
+        return res
+
+    def skip(name, why):
+        results[name] = None
+        print('{0:10s} skipped ({1})'.format(name, why), flush=True)
+
+    spec = stage('spec', lambda: demo4.ElevatorSpec(N, M, TL))
+    specfname = os.path.join(workdir, 'spec.txt')
+    stage('make_spec', lambda: demo4.make_spec(spec.assumptions, spec.guarantees, specfname))
+
+    kissfname = os.path.join(workdir, 'out.kiss')
+    dotfname = os.path.join(HERE, 'demo4_4f.dot')
+    if os.path.exists(strix.STRIX):
+        def run_strix():
+            stats = {}
+            verdict = strix.run(demo4.spec_writer(spec.assumptions, spec.guarantees), spec.ins, spec.outs, kissfname, stats=stats)
+            return verdict, stats['maxrss']
+        verdict = stage('strix', run_strix, 1, child=True)
+        if verdict == 'REALIZABLE':
+            graph = kiss.load_kiss(kissfname)
+            dotfname = os.path.join(workdir, 'out.dot')
+
+            def write_dot():
+                with open(dotfname, 'w') as fout:
+                    kiss.write_dot(graph, fout)
+            stage('write_dot', write_dot)
+        else:
+            skip('write_dot', verdict)
+    else:
+        skip('strix', strix.STRIX + ' not found')
+        skip('write_dot', 'no strix output')
+
+    if shutil.which('dot'):
+        svgfname = os.path.join(workdir, 'out.svg')
+        def svg():
+            p = subprocess.Popen(['dot', '-Tsvg', '-o' + svgfname, dotfname], stdout=subprocess.DEVNULL)
+            strix.wait(p)
+            return None, p.rusage.ru_maxrss * 1024
+        stage('svg', svg, 1, child=True)
+    else:
+        skip('svg', 'graphviz not found')
+
+    graph = stage('load_dot', lambda: demo4_play.load_dot(dotfname))
+    table = automaton.compile_graph(graph, len(spec.ins))
+    rnd = random.Random(0)
+    xs = [rnd.randrange(1 << table.n_ins) for _ in range(steps)]
+
+    def play():
+        cur = table.start
+        for x in xs:
+            step = table.step(cur, x)
+            if step is not None:
+                cur = step[0]
+    stage('step', play)
+    m = results['step']
+    m['per_step'] = m['wall'] / steps
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    return list of (stage, metric, baseline, now) which regressed
+    """
+    bad = []
+    for name, m in results.items():
+        b = baseline.get(name)
+        if m is None or b is None:
+            continue
+        for metric in ('wall', 'child_cpu'):
+            if m[metric] > b[metric] * (1 + threshold) and m[metric] - b[metric] > MIN_DIFF:
+                bad.append((name, metric, b[metric], m[metric]))
+        for metric in ('mem', 'child_maxrss'):
+            if metric in m and metric in b and m[metric] > b[metric] * (1 + threshold) and m[metric] - b[metric] > MIN_MEM_DIFF:
+                bad.append((name, metric, b[metric], m[metric]))
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--floors', type=int, default=demo4.N)
+    parser.add_argument('--lifts', type=int, default=demo4.M)
+    parser.add_argument('--steps', type=int, default=100000, help='steps of the dispatch stage')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of the in-process stages, fastest is kept')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='save results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_stages(args.floors, args.lifts, demo4.TL, args.steps, args.repeat, workdir)
+    key = 'N={0},M={1}'.format(args.floors, args.lifts)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if args.save:
+        baselines[key] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('saved baseline', key, 'to', args.baseline)
+        return
+    if key not in baselines:
+        print('no baseline for', key, 'run with --save first')
+        return
+    bad = compare(results, baselines[key], args.threshold)
+    for name, metric, b, now in bad:
+        print('REGRESSION {0} {1}: {2:.4g} -> {3:.4g} ({4:+.0%})'.format(name, metric, b, now, now / b - 1))
+    if bad:
+        sys.exit(1)
+    print('no regression')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Compile the controller into a standalone python module.
+
+The generated module has the dense transition table as tuples and
+
+    step(state, inputs) -> (state, outputs), or None if inputs break the assumption
+
+where inputs is the packed input bit vector (bit i is req_i) or a sequence
+of 0/1 and START is the initial state. Importing it reads no file.
+
+    python codegen.py demo4_4f.dot controller.py
+
+After writing, the module is imported and checked against the graph
+interpreted edge by edge as demo4_play.match does.
+"""
+import importlib.util
+import sys
+import types
+
+import automaton
+import demo4_play
+import kiss
+from equiv import distinguish
+from minimize import minimize
+
+TEMPLATE = '''"""
+Controller generated by codegen.py from {source}, do not edit.
+"""
+N_INS = {n_ins}
+START = {start}
+
+# NEXT[state << N_INS | x] is the state after input x, -1 if x breaks the assumption
+NEXT = {next_node}
+
+# SIGNALS[OUT[state << N_INS | x]] are the outputs, -1 is don't care
+OUT = {out}
+
+SIGNALS = {signals}
+
+# 1回の参照で済むように結果を並べておく
+STEP = tuple(None if n < 0 else (n, SIGNALS[o]) for n, o in zip(NEXT, OUT))
+
+
+def step(state, inputs):
+    if type(inputs) is not int:
+        x = 0
+        for i, v in enumerate(inputs):
+            if v == 1:
+                x |= 1 << i
+        inputs = x
+    return STEP[state << N_INS | inputs]
+'''
+
+
+def _tuple(values, per_line=32):
+    values = list(values)
+    lines = []
+    for k in range(0, len(values), per_line):
+        lines.append('    ' + ', '.join(map(str, values[k:k + per_line])) + ',')
+    return '(\n' + '\n'.join(lines) + '\n)'
+
+
+def generate(graph, n_ins, fout, source='graph', start=0):
+    """
+    write the module for graph (from load_dot) to text file fout
+    """
+    table = automaton.compile_graph(graph, n_ins, start)
+    ids = {}
+    out = []
+    for sig in table.outs:
+        out.append(0 if sig is None else ids.setdefault(sig, len(ids)))
+    signals = sorted(ids, key=ids.get)
+    fout.write(TEMPLATE.format(
+        source=source, n_ins=n_ins, start=start,
+        next_node=_tuple(table.next_node), out=_tuple(out),
+        signals='(\n' + ''.join('    {0!r},\n'.format(tuple(sig)) for sig in signals) + ')'))
+
+
+class Interpreted(object):
+    """
+    graph stepped by scanning the edges with demo4_play.match
+    """
+    def __init__(self, graph, n_ins, start=0):
+        self.graph = graph
+        self.n_ins = n_ins
+        self.start = start
+
+    def step(self, cur, x):
+        ins_v = [(x >> i) & 1 for i in range(self.n_ins)]
+        for ins_cond, outs_signal, node_to in self.graph.get(cur, []):
+            if demo4_play.match(ins_cond, ins_v):
+                return node_to, tuple(outs_signal)
+        return None
+
+
+def load_module(fname):
+    spec = importlib.util.spec_from_file_location('controller', fname)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def check(mod, graph, n_ins):
+    """
+    None if module mod behaves as graph, otherwise the distinguishing trace (see equiv.distinguish)
+
+    >>> import io, os, tempfile
+    >>> g = {0: [([1, -1], [1], 1), ([-1, -1], [0], 0)], 1: [([0, 0], [1], 0)]}
+    >>> with tempfile.TemporaryDirectory() as d:
+    ...     fname = os.path.join(d, 'ctrl.py')
+    ...     with open(fname, 'w') as f:
+    ...         generate(g, 2, f)
+    ...     mod = load_module(fname)
+    >>> mod.step(mod.START, [1, 1]), mod.step(1, 1)
+    ((1, (1,)), None)
+    >>> check(mod, g, 2)
+    """
+    table = types.SimpleNamespace(n_ins=mod.N_INS, start=mod.START, step=mod.step)
+    return distinguish(table, Interpreted(graph, n_ins))
+
+
+def main():
+    src, dest = sys.argv[1], sys.argv[2]
+    graph = demo4_play.load_dot(src)
+    n_ins = kiss.n_inputs(graph)
+    with open(dest, 'w') as fout:
+        generate(minimize(graph, n_ins), n_ins, fout, source=src)
+    d = check(load_module(dest), graph, n_ins)
+    if d is not None:
+        print('generated module differs from {0} after inputs {1}'.format(src, d[0]))
+        sys.exit(1)
+    print('wrote', dest)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,42 @@
 import itertools
-import subprocess
 import collections
 import re
+import functools
+import io
+import json
+import os
+import sys
+
+import automaton
+import demo4_play
+import instrument
+import kiss
+import render
+import strix
+from equiv import distinguish
+from minimize import minimize, count
+from quickxplain import quickxplain
+from ltl import Var, Not, And, Or, Implies, Iff, X, F, G, R, lift, dumps, simplify, conjuncts, subterms
 
 INF = float('inf')
 
 def enum(states):
+    """
+    exactly one of states is true
+
+    >>> enum(['a', 'b', 'c'])
+    G(a <-> !(b || c)) && G(b <-> !(a || c)) && G(c <-> !(a || b))
+    """
     flist = []
     for i, v in enumerate(states):
-        flist.append('G({0} <-> !({1}))'.format(v, ' || '.join(states[:i] + states[i+1:])))
-    return "(" + ' && '.join(flist) + ")"
+        flist.append(G(Iff(v, Not(Or(*(states[:i] + states[i+1:]))))))
+    return And(*flist)
 
 def oneof(states):
     flist = []
     for i, v in enumerate(states):
-        flist.append('G({0} -> !({1}))'.format(v, ' || '.join(states[:i] + states[i+1:])))
-    return ' && '.join(flist)
+        flist.append(G(Implies(v, Not(Or(*(states[:i] + states[i+1:]))))))
+    return And(*flist)
 
 
 def move(moves):
@@ -26,41 +47,30 @@ def move(moves):
     flist.append(enum(list(al)))
     for k, vlist in moves.items():
         vv = vlist + [k]
-        flist.append("G({0} -> X({1}))".format(k, ' || '.join(vv)))
-    return ' && '.join(flist)
-
-def wrap(x):
-    """
-    >>> wrap('a')
-    'a'
-
-    >>> wrap('a && b')
-    '(a && b)'
-    """
-    if ' ' in x:
-        return '(' + x + ')'
-    return x
+        flist.append(G(Implies(k, X(Or(*vv)))))
+    return And(*flist)
 
 def precondition(a, b):
     """
     a is true if b is true
     """
-    a = wrap(a)
-    b = wrap(b)
-    return "G({1} -> {0})".format(a, b)
+    return G(Implies(b, a))
 
 def neXt(a, lag):
     """
     >>> neXt('a', 0)
-    'a'
+    a
 
     >>> neXt('a', 1)
-    'X(a)'
+    X(a)
 
     >>> neXt('a', 2)
-    'X(X(a))'
+    X(X(a))
     """
-    return 'X(' * lag + a + ')' * lag
+    a = lift(a)
+    for _ in range(lag):
+        a = X(a)
+    return a
 
 def keep(a, end, begin=0):
     """
@@ -68,40 +78,39 @@ def keep(a, end, begin=0):
     if end == INF use G.
     if end == INF use F.
 
-    >>> keep(a, 0)
-    'a'
+    >>> keep('a', 0)
+    a
 
-    >>> keep(a, 1)
-    '(a && X(a))'
+    >>> keep('a', 1)
+    a && X(a)
 
-    >>> keep(a, 2)
-    '(a && X(a) && X(X(a)))'
+    >>> keep('a', 2)
+    a && X(a) && X(X(a))
 
-    >>> keep(a, 2, 1)
-    '(X(a) && X(X(a)))'
+    >>> keep('a', 2, 1)
+    X(a) && X(X(a))
 
-    >>> keep(a, INF)
-    'G(a)'
+    >>> keep('a', INF)
+    G(a)
 
-    >>> keep(a, INF, 1)
-    'X(G(a))'
+    >>> keep('a', INF, 1)
+    X(G(a))
 
-    >>> keep(a, INF, 2)
-    'X(X(G(a)))'
+    >>> keep('a', INF, 2)
+    X(X(G(a)))
 
-    >>> keep(a, INF, INF)
-    'F(G(a))'
+    >>> keep('a', INF, INF)
+    F(G(a))
     """
     assert end >= begin
-    a = wrap(a)
     if end == INF:
         if begin == INF:
-            return 'F(G({0}))'.format(a)
-        return neXt('G({0})'.format(a), begin)
+            return F(G(a))
+        return neXt(G(a), begin)
     flist = []
     for i in range(begin, end + 1):
         flist.append(neXt(a, i))
-    return wrap(' && '.join(flist))
+    return And(*flist)
 
 def within(a, end, begin=0):
     """
@@ -110,228 +119,213 @@ def within(a, end, begin=0):
     if begin == INF use F, but F(F(a)) == F(a)
 
 
-    >>> within(a, 0)
-    'a'
+    >>> within('a', 0)
+    a
 
-    >>> within(a, 1)
-    '(a || X(a))'
+    >>> within('a', 1)
+    a || X(a)
 
-    >>> within(a, 2)
-    '(a || X(a) || X(X(a)))'
+    >>> within('a', 2)
+    a || X(a) || X(X(a))
 
-    >>> within(a, 2, 1)
-    '(X(a) || X(X(a)))'
+    >>> within('a', 2, 1)
+    X(a) || X(X(a))
 
-    >>> within(a, INF)
-    'F(a)'
+    >>> within('a', INF)
+    F(a)
 
-    >>> within(a, INF, 1)
-    'X(F(a))'
+    >>> within('a', INF, 1)
+    X(F(a))
 
-    >>> within(a, INF, 2)
-    'X(X(F(a)))'
+    >>> within('a', INF, 2)
+    X(X(F(a)))
 
-    >>> within(a, INF, INF)
-    'F(a)'
+    >>> within('a', INF, INF)
+    F(a)
     """
     assert end >= begin
-    a = wrap(a)
     if end == INF:
         if begin == INF:
-            return 'F({0})'.format(a)
-        return neXt('F({0})'.format(a), begin)
+            return F(a)
+        return neXt(F(a), begin)
     flist = []
     for i in range(begin, end + 1):
         flist.append(neXt(a, i))
-    return wrap(' || '.join(flist))
+    return Or(*flist)
 
 def necessary_init(a, b, lag=0):
     """
     At beginning of system, a is necessary for b
 
     >>> necessary_init('a', 'b', 0)
-    '(a R !b)'
+    a R !b
 
     >>> necessary_init('a', 'b', 1)
-    '(a R (!b && X(!b)))'
+    a R (!b && X(!b))
     """
-    a = wrap(a)
-    b = wrap(b)
-    neg_b = '!' + b
-    return "({0} R {1})".format(a, keep(neg_b, lag))
+    return R(a, keep(Not(b), lag))
 
 def necessary_up_init(a, b, lag=0):
     """
     At beginning of system, up of a `(!a && X(a))` is necessary for b
 
     >>> necessary_up_init('a', 'b', 0)
-    '((!a && X(a)) R (!b && X(!b)))'
+    (!a && X(a)) R (!b && X(!b))
 
     >>> necessary_up_init('a', 'b', 1)
-    '((!a && X(a)) R (!b && X(!b) && X(X(!b))))'
+    (!a && X(a)) R (!b && X(!b) && X(X(!b)))
     """
-    a = wrap(a)
-    b = wrap(b)
-    neg_b = '!' + b
-    return "((!{0} && X({0})) R {1})".format(a, keep(neg_b, lag + 1))
+    return R(And(Not(a), X(a)), keep(Not(b), lag + 1))
 
 def necessary_again(a, b, lag=0):
     """
     a is necessary for b again. b is free at initial state.
 
-    >>> necessary_anytime('a', 'b', 0)
-    'G((b && X(!b)) -> X((a R !b)))'
+    >>> necessary_again('a', 'b', 0)
+    G((b && X(!b)) -> X(a R !b))
 
-    >>> necessary_anytime('a', 'b', 1)
-    'G((b && X(!b)) -> X((a R (!b && X(!b)))))'
+    >>> necessary_again('a', 'b', 1)
+    G((b && X(!b)) -> X(a R (!b && X(!b))))
     """
-    a = wrap(a)
-    b = wrap(b)
-    neg_b = '!' + b
-    return "G(({1} && X(!{1})) -> X({2}))".format(a, b, necessary_init(a, b, lag))
+    return G(Implies(And(b, X(Not(b))), X(necessary_init(a, b, lag))))
 
 def necessary_up_again(a, b, lag=0):
     """
     up of a `(!a && X(a))` is necessary for b again. b is free at initial state.
 
     >>> necessary_up_again('a', 'b', 0)
-    'G((b && X(!b)) -> X(((!a && X(a)) R (!b && X(!b)))))'
+    G((b && X(!b)) -> X((!a && X(a)) R (!b && X(!b))))
 
     >>> necessary_up_again('a', 'b', 1)
-    'G((b && X(!b)) -> X(((!a && X(a)) R (!b && X(!b) && X(X(!b))))))'
+    G((b && X(!b)) -> X((!a && X(a)) R (!b && X(!b) && X(X(!b)))))
     """
-    a = wrap(a)
-    b = wrap(b)
-    neg_b = '!' + b
-    return "G(({1} && X(!{1})) -> X({2}))".format(a, b, necessary_up_init(a, b, lag))
+    return G(Implies(And(b, X(Not(b))), X(necessary_up_init(a, b, lag))))
 
 def keep_until(a, b, lag=0):
     """
     b must hold until a true. b is free at initial state.
 
-    >>> keep_until(a, b, 0)
-    'G((!b && X(!!b)) -> X((a R !!b)))'
+    >>> keep_until('a', 'b', 0)
+    G((!b && X(!!b)) -> X(a R !!b))
 
-    >>> keep_until(a, b, 1)
-    'G((!b && X(!!b)) -> X((a R (!!b && X(!!b)))))'
+    >>> keep_until('a', 'b', 1)
+    G((!b && X(!!b)) -> X(a R (!!b && X(!!b))))
     """
-    b = wrap(b)
-    return necessary_again(a, '!' + b, lag)
+    return necessary_again(a, Not(b), lag)
 
 def necessary_anytime(a, b, lag=0):
     """
     a is necessary for b
 
     >>> necessary_anytime('a', 'b', 0)
-    '((a R !b) && G((b && X(!b)) -> X((a R !b))))'
+    (a R !b) && G((b && X(!b)) -> X(a R !b))
 
     >>> necessary_anytime('a', 'b', 1)
-    '((a R (!b && X(!b))) && G((b && X(!b)) -> X((a R (!b && X(!b))))))'
+    (a R (!b && X(!b))) && G((b && X(!b)) -> X(a R (!b && X(!b))))
     """
-    a = wrap(a)
-    b = wrap(b)
-    return "(" + necessary_init(a, b, lag) + " && " + necessary_again(a, b, lag) + ")"
+    return And(necessary_init(a, b, lag), necessary_again(a, b, lag))
 
 def necessary_up_anytime(a, b, lag=0):
     """
     up a `(!a && X(a))` is necessary for b
 
-    >>> necessary_anytime('a', 'b', 0)
-    '(((!a && X(a)) R !b) && G((b && X(!b)) -> X(((!a && X(a)) R !b))))'
-
-    >>> necessary_anytime('a', 'b', 1)
-    '(((!a && X(a)) R (!b && X(!b))) && G((b && X(!b)) -> X(((!a && X(a)) R (!b && X(!b))))))'
+    >>> necessary_up_anytime('a', 'b', 0)
+    ((!a && X(a)) R (!b && X(!b))) && G((b && X(!b)) -> X((!a && X(a)) R (!b && X(!b))))
     """
-    a = wrap(a)
-    b = wrap(b)
-    return "(" + necessary_up_init(a, b, lag) + " && " + necessary_up_again(a, b, lag) + ")"
+    return And(necessary_up_init(a, b, lag), necessary_up_again(a, b, lag))
 
 def necessary_again_and_activate(a, b, lag=0):
-    return "(" + necessary_again(a, b, lag) + " && " + activate(a, b, INF) + ")"
+    return And(necessary_again(a, b, lag), activate(a, b, INF))
 
 def necessary_anytime_and_activate(a, b, lag=0):
-    return "(" + necessary_anytime(a, b, lag) + " && " + activate(a, b, INF) + ")"
+    return And(necessary_anytime(a, b, lag), activate(a, b, INF))
 
 def auto_down_and_necessary_again(a, b, lag=0):
     """
     b can keep only 1 time and a is necessary for b again
 
-    This is same to `auto_down(b) + ' && ' + necessary_again(a, b, lag)` in themantic layer but simpler formula.
+    This is same to `And(auto_down(b), necessary_again(a, b, lag))` in themantic layer but simpler formula.
 
-    >>> auto_down_and_necessary_again(a,b,0)
-    'G(b -> X(a R !b))'
+    >>> auto_down_and_necessary_again('a', 'b', 0)
+    G(b -> X(a R !b))
 
-    >>> auto_down_and_necessary_again(a,b,1)
-    'G(b -> X(a R (!b && X(!b))))'
+    >>> auto_down_and_necessary_again('a', 'b', 1)
+    G(b -> X(a R (!b && X(!b))))
     """
     assert lag != INF
-    a = wrap(a)
-    b = wrap(b)
-    neg_b = '!' + b
-    return "G({1} -> X({0} R {2}))".format(a, b, keep(neg_b, lag))
+    return G(Implies(b, X(R(a, keep(Not(b), lag)))))
 
-def activate(a, b, lag=0):
+def activate(a, b, lag=0, timer=None):
     """
     a activate b within lag
     lag can be INF.
+    with a Timer the deadline is counted by its flags instead of lag nested X (see Timer.within).
 
-    >>> activate(a,b,0)
-    'G(a -> b)'
+    >>> activate('a', 'b', 0)
+    G(a -> b)
 
-    >>> activate(a,b,1)
-    'G(a -> (b || X(b)))'
+    >>> activate('a', 'b', 1)
+    G(a -> (b || X(b)))
 
-    >>> activate(a,b,2)
-    'G(a -> (b || X(b) || X(X(b))))'
+    >>> activate('a', 'b', 2)
+    G(a -> (b || X(b) || X(X(b))))
 
-    activate(a,b,INF)
-    'G(a -> F(b))'
+    >>> activate('a', 'b', INF)
+    G(a -> F(b))
     """
     assert lag >= 0
-    a = wrap(a)
-    b = wrap(b)
-    return "G({0} -> {1})".format(a, within(b, lag))
+    if timer is not None and lag != INF:
+        return timer.within(a, b, lag)
+    return G(Implies(a, within(b, lag)))
+
+def hold(a, b, lag=0, timer=None):
+    """
+    a keeps b for lag steps after it
+    with a Timer the steps are counted by its flags instead of lag nested X (see Timer.keep).
+
+    >>> hold('a', 'b', 2)
+    G(a -> (b && X(b) && X(X(b))))
+    """
+    if timer is not None and lag != INF:
+        return timer.keep(a, b, lag)
+    return G(Implies(a, keep(b, lag)))
 
-def deactivate(a, b, lag=0):
+def deactivate(a, b, lag=0, timer=None):
     """
     a deactivate b with in lag
     lag can be INF
 
-    >>> deactivate(a,b,0)
-    'G(a -> !b)'
+    >>> deactivate('a', 'b', 0)
+    G(a -> !b)
 
-    >>> deactivate(a,b,1)
-    'G(a -> (!b || X(!b)))'
+    >>> deactivate('a', 'b', 1)
+    G(a -> (!b || X(!b)))
 
-    >>> deactivate(a,b,2)
-    'G(a -> (!b || X(!b) || X(X(!b))))'
+    >>> deactivate('a', 'b', 2)
+    G(a -> (!b || X(!b) || X(X(!b))))
 
-    >>> deactivate(a,b,INF)
-    'G(a -> F(!b))'
+    >>> deactivate('a', 'b', INF)
+    G(a -> F(!b))
     """
     assert lag >= 0
-    b = wrap(b)
-    neg_b = '!' + b
-    return activate(a, neg_b, lag)
+    return activate(a, Not(b), lag, timer)
 
 def auto_down(a, lag=1):
     """
     a can keep only lag time.
     lag can be INF
 
-    >>> auto_down(a, 1)
-    'G(a -> X(!a))'
+    >>> auto_down('a', 1)
+    G(a -> X(!a))
 
-    >>> auto_down(a, 2)
-    'G(a -> (X(!a) || X(X(!a))))'
+    >>> auto_down('a', 2)
+    G(a -> (X(!a) || X(X(!a))))
 
-    >>> auto_down(a, INF)
-    'G(a -> X(F(!a)))'
+    >>> auto_down('a', INF)
+    G(a -> X(F(!a)))
     """
     assert lag >= 1
-    a = wrap(a)
-    neg_a = '!' + a
-    return "G({0} -> {1})".format(a, within(neg_a, lag, begin=1))
+    return G(Implies(a, within(Not(a), lag, begin=1)))
 
 class BinConverter(object):
     def __init__(self, states, prefix):
@@ -341,15 +335,16 @@ class BinConverter(object):
 
         self.need_flags = len(bin(len(states) - 1)) - 2  # 3状態なら, 00,01,10で表せるので2つのフラグがあればいい
         self.flags = ['{0}{1}'.format(prefix, i) for i in range(self.need_flags)]
-        if 2 ** self.need_flags > len(states):
-            # 00,01,10,11のうち11は使わない.
-            # 全部trueの場合を除けばいい
-            self.flist.append('G(' + ' || ' .join(f'!{f}' for f in self.flags) + ')')
 
         self.values = {}
         for st in states:
             self.values[st] = self.conv(st)
 
+        if 2 ** self.need_flags > len(states):
+            # 00,01,10,11のうち11は使わない.
+            # 5状態なら101,110,111を使わないので, どれかの状態であることにする
+            self.flist.append(G(Or(*(self.values[st] for st in states))))
+
     def conv(self, state):
         """
         convert state to binary representation
@@ -360,15 +355,109 @@ class BinConverter(object):
         for i, c in enumerate(reversed(bins)):
             f = self.flags[i]
             if c == '1':
-                fs.append(f)
+                fs.append(Var(f))
             else:
-                fs.append('!{0}'.format(f))
-        return '({0})'.format(' && '.join(fs))
+                fs.append(Not(f))
+        return And(*fs)
 
     def __getitem__(self, st):
         return self.values[st]
 
 
+class Timer(object):
+    """
+    Binary counter on output flags for bounded windows.
+
+    The nested X of within/keep grows quadratically with the lag, the counter
+    only compares and decrements log(lag) flags. The flags must be added to outs,
+    use one Timer per window (e.g. per floor).
+
+    >>> t = Timer(2, 't')
+    >>> t.flags
+    ['t0', 't1']
+    >>> t.within('a', 'b', 2)
+    G(a -> (!t1 || !t0)) && G((!t0 && !t1) -> b) && G(((!t1 || !t0) && !b) -> ((X(t0) <-> !t0) && (X(t1) <-> (t1 <-> t0))))
+    """
+    def __init__(self, lag, prefix):
+        # 0..lag+1の値を使う
+        self.need_flags = max(len(bin(lag + 1)) - 2, 1)
+        self.flags = ['{0}{1}'.format(prefix, i) for i in range(self.need_flags)]
+
+    def eq(self, n):
+        """
+        counter is n
+        """
+        return And(*(Var(f) if (n >> i) & 1 else Not(f) for i, f in enumerate(self.flags)))
+
+    def le(self, n):
+        """
+        counter is at most n, None if always true
+        """
+        def le(i, n):
+            # flags[:i+1]の値がn以下
+            if n >= (1 << (i + 1)) - 1:
+                return None
+            half = 1 << i
+            if i == 0:
+                return Not(self.flags[0])
+            if n >= half:
+                return Or(Not(self.flags[i]), le(i - 1, n - half))
+            rest = le(i - 1, n)
+            return Not(self.flags[i]) if rest is None else And(Not(self.flags[i]), rest)
+        return le(self.need_flags - 1, n)
+
+    def gt(self, n):
+        """
+        counter is more than n, None if always true
+        """
+        def gt(i, n):
+            # flags[:i+1]の値がnより大きい
+            if n < 0:
+                return None
+            half = 1 << i
+            if i == 0:
+                return Var(self.flags[0])
+            if n >= half:
+                return And(Var(self.flags[i]), gt(i - 1, n - half))
+            if n == half - 1:
+                return Var(self.flags[i])
+            return Or(Var(self.flags[i]), gt(i - 1, n))
+        return gt(self.need_flags - 1, n)
+
+    def dec(self):
+        """
+        counter at the next step is the counter - 1
+        """
+        # bit iは下のbitが全部0のときだけ反転する
+        flist = [Iff(X(self.flags[0]), Not(self.flags[0]))]
+        for i in range(1, self.need_flags):
+            flist.append(Iff(X(self.flags[i]), Iff(self.flags[i], Or(*self.flags[:i]))))
+        return And(*flist)
+
+    def within(self, a, b, lag):
+        """
+        G(a -> within(b, lag)) with the counter as remaining steps until b.
+        a sets the counter to at most lag, it counts down while b is false and b must hold at 0.
+        values above lag mean nothing is pending.
+        """
+        return And(
+            G(Implies(a, self.le(lag))),
+            G(Implies(self.eq(0), b)),
+            G(Implies(And(self.le(lag), Not(b)), self.dec())),
+        )
+
+    def keep(self, a, b, lag):
+        """
+        G(a -> keep(b, lag)) with the counter as steps b must still hold.
+        a sets the counter to more than lag, it counts down until the next a and b holds while it is not 0.
+        """
+        return And(
+            G(Implies(a, self.gt(lag))),
+            G(Implies(self.gt(0), b)),
+            G(Implies(And(self.gt(0), X(Not(a))), self.dec())),
+        )
+
+
 class NopConverter(object):
     def __init__(self, states, names):
         self.states = states
@@ -377,213 +466,459 @@ class NopConverter(object):
 
         self.values = {}
         for st, nm in zip(states, names):
-            self.values[st] = nm
+            self.values[st] = Var(nm)
 
     def __getitem__(self, st):
         return self.values[st]
 
 verified_ver = 2  # ver1 worked at 2020-03-26 15:33
+# 'core': QuickXplainで最小の矛盾集合を探す, 'combination': 組み合わせを全部試す
+find_mode = 'core'
 
 M = 1  # Num of elevator
 N = 4  # Num of floor
 TL = INF  # timelimit
+counter = False  # TLをX(X(...))ではなくTimerで数える
 
-lft = []
-move = []
-for j in range(M):
-    #lft.append(BinConverter(list(range(N)), 'lft{0}_'.format(j)))
-    #move.append(BinConverter(["stop", "up", "down"], 'move{0}_'.format(j)))
-    lft.append(NopConverter(list(range(N)), [f'lft{j}_{i}' for i in range(N)]))
-    move.append(NopConverter(["stop", "up", "down"], [f"stop{j}", f"up{j}", f"down{j}"]))
+# 状態グループごとの変数の表し方. tune.pyで測って選ぶ
+DEFAULT_ENCODING = {'lft': 'nop', 'move': 'nop'}
+ENCODINGS = ('nop', 'bin')
+encoding_file = 'examples/encoding.json'
 
-# リフト飛び出しボタンが押されたらそれを保存する
-go = ["go_{0}".format(i) for i in range(N)]
-
-# リフトを呼ぶボタン
-req = ["req_{0}".format(i) for i in range(N)]
-# リフトごとのドアの閉開状態
-opn = ["open_{0}".format(j) for j in range(M)]
+def load_encoding(N, M, fname=None):
+    """
+    encoding recorded by tune.py for N floors and M lifts, None if not tuned
+    """
+    try:
+        with open(fname or encoding_file) as f:
+            return json.load(f).get('{0},{1}'.format(N, M), {}).get('encoding')
+    except FileNotFoundError:
+        return None
 
+class ElevatorSpec(object):
+    """
+    Spec of N floor building with M lifts.
+    TL is the time limit for a request to be granted (INF means eventually).
+    With counter the time limit is counted by a Timer per floor (flags t{i}_*, added to outs after go).
+    encoding selects 'nop' (one-hot) or 'bin' (BinConverter) for the 'lft' and 'move' groups.
+    The other tools read the outputs one-hot, one_hot() converts a controller of this spec.
 
-def elevator_phisics(j, N):
-    flist = []
+    assumptions and guarantees are lists of (version, formula), ins and outs are the strix variables.
+    """
+    def __init__(self, N, M, TL=INF, counter=False, encoding=None):
+        self.N = N
+        self.M = M
+        self.TL = TL
 
-    # 急に方向転換できない
-    flist.append(f"G({move[j]['up']} -> X({move[j]['stop']} || {move[j]['up']})) && G({move[j]['down']} -> X({move[j]['stop']} || {move[j]['down']}))")
-    # 最下階・最上階のときのリフトの動き
-    flist.append(f"G({lft[j][0]} -> ({move[j]['stop']} || {move[j]['up']}))")
-    flist.append(f"G({lft[j][N-1]} -> ({move[j]['stop']} || {move[j]['down']}))")
-    # stop
-    for i in range(N):
-        flist.append(f"G(({lft[j][i]} && {move[j]['stop']}) -> X({lft[j][i]}))")
-    # up
-    for i in range(N - 1):
-        flist.append(f"G(({lft[j][i]} && {move[j]['up']}) -> X({lft[j][i+1]}))")
-    # down
-    for i in range(1, N):
-        flist.append(f"G(({lft[j][i]} && {move[j]['down']}) -> X({lft[j][i-1]}))")
-
-    # 止まったあと（止まった瞬間は含まない)はドアをOpenできる.
-    flist.append(f"G(X({opn[j]}) -> ({move[j]['stop']} && X({move[j]['stop']})))")
-    # ドアが空いているならStopしている
-    flist.append(f"G({opn[j]} -> {move[j]['stop']})")
-
-    return flist
-
-def some_lift_move(M):
-    all_stop = ' || '.join(move[j]['stop'] for j in range(M))
-    return f'!({all_stop})'
-
-def elevator_rule(N, M):
-    flist = []
-    # 呼ばれてないのに動かない
-    # flist.append(f"G(({' || '.join(go)}) R ({' && '.join(move[j]['stop'] for j in range(M))}))")
-    # flist.append(necessary_anytime(' || '.join(go), '!(' + ' || '.join(move[j]['stop'] for j in range(M)) + ')'))
-    flist.append(f"G({some_lift_move(M)} -> ({' || '.join(go)}))")
-    return flist
-
-def grant(i):
-    # 要求した階にリフトが到着しドアが開いている状態
-    return "(" + " || ".join([f"({lft[j][i]} && {opn[j]})" for j in range(M)]) + ")"
-
-assumptions = [
-    # 最初はどこも要求していない
-    (0, " && ".join(f"!{req[i]}" for i in range(N))),
-    # (1, " && ".join(["G(F(!{0}))".format(r) for r in req]))
-]
-
-guarantees = [
-    (0, ' && '.join(f"!{opn[j]}" for j in range(M))),
-    (0, ' && '.join(f"{move[j]['stop']}" for j in range(M))),
-    # GOAL リフトを呼び出したらリフトが来る
-    (1, ' && '.join(activate(req[i], grant(i), TL) for i in range(N))),
-]
-
-for l in lft:
-    for x in l.flist:
-        guarantees.append((1, x))
-for m in move:
-    for x in m.flist:
-        guarantees.append((1, x))
-
-for j in range(M):
-    # phisics constraints
-    for f in elevator_phisics(j, N):
-        guarantees.append((1, f))
-
-for i in range(N):
-    # 要求されたらgoをtrueにする
-    guarantees.append((1, f"G((!{grant(i)} && !{go[i]} && {req[i]}) -> X({grant(i)} R {go[i]}))"))
-    # リフトが到達してドアを開けたらgoをfalseにする
-    guarantees.append((1, f"G(({grant(i)} && !{req[i]}) -> X(!{go[i]}))"))
-    # 要求されたときだけgoをtrueにする
-    guarantees.append((2, f"G((!{go[i]} && X({go[i]})) -> X({req[i]}))"))
-    # goはgrantまで消えない
-    guarantees.append((2, keep_until(neXt(grant(i), 1), go[i])))
-
-# rule
-for f in elevator_rule(N, M):
-    guarantees.append((1, f))
+        self.lft = []
+        self.move = []
+        self.encoding = dict(DEFAULT_ENCODING, **(encoding or {}))
+        for j in range(M):
+            if self.encoding['lft'] == 'bin':
+                self.lft.append(BinConverter(list(range(N)), 'lft{0}_'.format(j)))
+            else:
+                self.lft.append(NopConverter(list(range(N)), [f'lft{j}_{i}' for i in range(N)]))
+            if self.encoding['move'] == 'bin':
+                self.move.append(BinConverter(["stop", "up", "down"], 'move{0}_'.format(j)))
+            else:
+                self.move.append(NopConverter(["stop", "up", "down"], [f"stop{j}", f"up{j}", f"down{j}"]))
+
+        # リフト飛び出しボタンが押されたらそれを保存する
+        self.go = ["go_{0}".format(i) for i in range(N)]
+
+        # リフトを呼ぶボタン
+        self.req = ["req_{0}".format(i) for i in range(N)]
+        # リフトごとのドアの閉開状態
+        self.opn = ["open_{0}".format(j) for j in range(M)]
+
+        self.ins = self.req
+        self.outs = []
+        for l in self.lft:
+            self.outs += l.flags
+        for m in self.move:
+            self.outs += m.flags
+        self.outs += self.opn
+        self.outs += self.go
+        self.timer = []
+        if counter and TL != INF:
+            self.timer = [Timer(TL, 't{0}_'.format(i)) for i in range(N)]
+            for t in self.timer:
+                self.outs += t.flags
+
+        self.assumptions = self.make_assumptions()
+        self.guarantees = self.make_guarantees()
+
+    def one_hot(self, graph):
+        """
+        graph (controller of this spec) with the outputs of bin encoded groups replaced by one-hot outputs,
+        so the outputs are in the order of the default encoding. a don't care flag takes the first matching state.
+
+        >>> spec = ElevatorSpec(3, 1, encoding={'lft': 'bin'})
+        >>> spec.outs[:6]
+        ['lft0_0', 'lft0_1', 'stop0', 'up0', 'down0', 'open_0']
+        >>> spec.one_hot({0: [([-1, -1, -1], [0, 1, 1, 0, 0, 1, 0, 0, 0], 0), ([-1, -1, -1], [-1, 0, 1, 0, 0, 1, 0, 0, 0], 0)]})
+        {0: [([-1, -1, -1], [0, 0, 1, 1, 0, 0, 1, 0, 0, 0], 0), ([-1, -1, -1], [1, 0, 0, 1, 0, 0, 1, 0, 0, 0], 0)]}
+        """
+        if self.encoding == DEFAULT_ENCODING:
+            return graph
+
+        def convert(sig):
+            out = []
+            pos = 0
+            for conv in self.lft + self.move:
+                vals = sig[pos:pos + len(conv.flags)]
+                pos += len(conv.flags)
+                if isinstance(conv, BinConverter):
+                    # BinConverterのconvと同じくフラグiがビットi
+                    n = next((n for n in range(len(conv.states))
+                              if all(v == -1 or v == (n >> i) & 1 for i, v in enumerate(vals))), None)
+                    if n is None:
+                        raise ValueError('{0} is not a state of {1}'.format(vals, conv.prefix))
+                    vals = [1 if k == n else 0 for k in range(len(conv.states))]
+                out += vals
+            return out + list(sig[pos:])
+
+        return {node: [(c, convert(o), t) for c, o, t in edges] for node, edges in graph.items()}
+
+    def elevator_phisics(self, j):
+        N, lft, move, opn = self.N, self.lft, self.move, self.opn
+        flist = []
+
+        # 急に方向転換できない
+        flist.append(And(G(Implies(move[j]['up'], X(Or(move[j]['stop'], move[j]['up'])))), G(Implies(move[j]['down'], X(Or(move[j]['stop'], move[j]['down']))))))
+        # 最下階・最上階のときのリフトの動き
+        flist.append(G(Implies(lft[j][0], Or(move[j]['stop'], move[j]['up']))))
+        flist.append(G(Implies(lft[j][N-1], Or(move[j]['stop'], move[j]['down']))))
+        # stop
+        for i in range(N):
+            flist.append(G(Implies(And(lft[j][i], move[j]['stop']), X(lft[j][i]))))
+        # up
+        for i in range(N - 1):
+            flist.append(G(Implies(And(lft[j][i], move[j]['up']), X(lft[j][i+1]))))
+        # down
+        for i in range(1, N):
+            flist.append(G(Implies(And(lft[j][i], move[j]['down']), X(lft[j][i-1]))))
+
+        # 止まったあと（止まった瞬間は含まない)はドアをOpenできる.
+        flist.append(G(Implies(X(opn[j]), And(move[j]['stop'], X(move[j]['stop'])))))
+        # ドアが空いているならStopしている
+        flist.append(G(Implies(opn[j], move[j]['stop'])))
+
+        return flist
+
+    def some_lift_move(self):
+        return Not(Or(*(self.move[j]['stop'] for j in range(self.M))))
+
+    def elevator_rule(self):
+        flist = []
+        # 呼ばれてないのに動かない
+        # flist.append(G(R(Or(*self.go), And(*(self.move[j]['stop'] for j in range(self.M))))))
+        # flist.append(necessary_anytime(Or(*self.go), self.some_lift_move()))
+        flist.append(G(Implies(self.some_lift_move(), Or(*self.go))))
+        return flist
+
+    def grant(self, i):
+        # 要求した階にリフトが到着しドアが開いている状態
+        return Or(*(And(self.lft[j][i], self.opn[j]) for j in range(self.M)))
+
+    def make_assumptions(self):
+        return [
+            # 最初はどこも要求していない
+            (0, And(*(Not(self.req[i]) for i in range(self.N)))),
+            # (1, And(*(G(F(Not(r))) for r in self.req)))
+        ]
+
+    def make_guarantees(self):
+        N, M, TL = self.N, self.M, self.TL
+        req, go, opn, grant = self.req, self.go, self.opn, self.grant
+        guarantees = [
+            (0, And(*(Not(opn[j]) for j in range(M)))),
+            (0, And(*(self.move[j]['stop'] for j in range(M)))),
+            # GOAL リフトを呼び出したらリフトが来る
+            (1, And(*(activate(req[i], grant(i), TL, self.timer[i] if self.timer else None) for i in range(N)))),
+        ]
+
+        for l in self.lft:
+            for x in l.flist:
+                guarantees.append((1, x))
+        for m in self.move:
+            for x in m.flist:
+                guarantees.append((1, x))
+
+        for j in range(M):
+            # phisics constraints
+            for f in self.elevator_phisics(j):
+                guarantees.append((1, f))
+
+        for i in range(N):
+            # 要求されたらgoをtrueにする
+            guarantees.append((1, G(Implies(And(Not(grant(i)), Not(go[i]), req[i]), X(R(grant(i), go[i]))))))
+            # リフトが到達してドアを開けたらgoをfalseにする
+            guarantees.append((1, G(Implies(And(grant(i), Not(req[i])), X(Not(go[i]))))))
+            # 要求されたときだけgoをtrueにする
+            guarantees.append((2, G(Implies(And(Not(go[i]), X(go[i])), X(req[i])))))
+            # goはgrantまで消えない
+            guarantees.append((2, keep_until(neXt(grant(i), 1), go[i])))
+
+        # rule
+        for f in self.elevator_rule():
+            guarantees.append((1, f))
+        return guarantees
+
+def write_spec(fout, assumptions, guarantees):
+    # 共通の部分式は一度だけ文字列にする
+    memo = {}
+    afirst = True
+    fout.write('(\n')
+    for v, a in assumptions:
+        if afirst:
+            afirst = False
+        else:
+            fout.write(' &&\n')
+        fout.write(' ( {0} )\n'.format(dumps(a, memo)))
+    fout.write(') -> (\n')
+    gfirst = True
+    for v, g in guarantees:
+        if gfirst:
+            gfirst = False
+        else:
+            fout.write(' &&\n')
+        fout.write(' ( {0} )\n'.format(dumps(g, memo)))
+    fout.write(')\n')
+
+def spec_size(assumptions, guarantees):
+    """
+    (distinct subformulas, chars of the text written for strix) of the spec
+    """
+    nodes = set()
+    for _, f in assumptions + guarantees:
+        nodes.update(subterms(f))
+    # 連言ごとの" ) &&\n ( "も数える
+    f = io.StringIO()
+    write_spec(f, assumptions, guarantees)
+    return len(nodes), len(f.getvalue())
+
+def simplify_spec(assumptions, guarantees, verbose=True):
+    """
+    conjoin and simplify assumptions and guarantees for strix.
+    each returned conjunct has the largest version, so keep the original lists to search wrong ones.
+    the original lists are returned if the simplified spec text is longer.
+    """
+    memo = {}
+
+    def conj(fs):
+        if not fs:
+            return []
+        v = max(v for v, _ in fs)
+        return [(v, f) for f in conjuncts(simplify(And(*[f for _, f in fs]), memo))]
+
+    sa, sg = conj(assumptions), conj(guarantees)
+    (n0, c0), (n1, c1) = spec_size(assumptions, guarantees), spec_size(sa, sg)
+    if verbose:
+        print('simplified spec: {0} -> {1} nodes, {2} -> {3} chars ({4:+.1%}){5}'.format(
+            n0, n1, c0, c1, c1 / c0 - 1, ', not used' if c1 > c0 else ''))
+    if c1 > c0:
+        return assumptions, guarantees
+    return sa, sg
 
 def make_spec(assumptions, guarantees, fname):
     with open(fname, 'w') as fout:
-        afirst = True
-        fout.write('(\n')
-        for v, a in assumptions:
-            if afirst:
-                afirst = False
-            else:
-                fout.write(' &&\n')
-            fout.write(' ( {0} )\n'.format(a))
-        fout.write(') -> (\n')
-        gfirst = True
-        for v, g in guarantees:
-            if gfirst:
-                gfirst = False
-            else:
-                fout.write(' &&\n')
-            fout.write(' ( {0} )\n'.format(g))
-        fout.write(')\n')
-
-ins = req
-outs = []
-for l in lft:
-    outs += l.flags
-for m in move:
-    outs += m.flags
-outs += opn
-outs += go
-print('ins=', ins)
-print('outs=', outs)
-def check_guarantees(assumptions, guarantees, fname, dotfname, svgfname):
-    make_spec(assumptions, guarantees, fname)
-    p = subprocess.run([
-        '/strix/bin/strix', '--kiss',
-        # '--minimize',
-        '--dot', fname,
-        '--ins=' + ','.join(ins),
-        '--outs=' + ','.join(outs),
-    ], stdout=subprocess.PIPE)
-    stdout = p.stdout.decode('utf-8')
-    ret = stdout.split('\n')
-    if ret[0] != 'REALIZABLE':
-        print('UNREALIZABLE')
+        write_spec(fout, assumptions, guarantees)
+
+def spec_writer(assumptions, guarantees):
+    """
+    function writing the spec to a file, the spec is built while strix reads it
+    """
+    return functools.partial(write_spec, assumptions=assumptions, guarantees=guarantees)
+
+# 同じspecでstrixを何度も呼ばないように結果を保存する
+cache = strix.Cache()
+# strix 1回あたりの制限. Noneなら制限しない
+strix_timeout = None  # sec
+strix_memory = None  # byte
+minimize_automaton = True  # strixの--minimizeは遅いのでPython側で最小化する
+render_svg = True  # Falseならsvgを作らない
+profile = True  # 最後に各段階の時間を表示する
+profile_file = None  # 'examples/demo4_profile.json'. instrument.pyでflamegraph用に変換できる
+# 辺がこれより多いと状態をまとめたsvgにする(リフトの位置, 動き, ドアでまとめる). Noneならいつも全部描く
+renderer = render.Renderer(max_edges=None, summary_outs=N * M + 4 * M)
+
+class NoVerdict(Exception):
+    """
+    strix answered neither REALIZABLE nor UNREALIZABLE (TIMEOUT, CANCELLED or failed),
+    nothing is known about the spec so the checks and searches cannot go on
+    """
+
+def answer(verdict, purpose):
+    if verdict not in strix.VERDICTS:
+        raise NoVerdict('strix gave no verdict for the {0} ({1}), stopped. strix_timeout={2} strix_memory={3}'.format(
+            purpose, verdict or 'failed', strix_timeout, strix_memory))
+    return verdict
+
+def run_strix(spec, ins, outs, dest=None, purpose=''):
+    """
+    strix.run with the settings above in a 'strix' span, which gets the verdict and the rusage of strix.
+    raise NoVerdict unless strix answered.
+    """
+    with instrument.span('strix', purpose=purpose) as stats:
+        verdict = strix.run(spec, ins, outs, dest, cache=cache, timeout=strix_timeout, max_memory=strix_memory, stats=stats)
+        stats['verdict'] = verdict
+    return answer(verdict, purpose)
+
+def check_guarantees(assumptions, guarantees, ins, outs, kissfname, dotfname, svgfname, spec=None):
+    """
+    write the controller as KISS and DOT (with one-hot outputs, see ElevatorSpec.one_hot) if realizable
+    """
+    verdict = run_strix(spec_writer(assumptions, guarantees), ins, outs, kissfname, 'guarantees')
+    if verdict != 'REALIZABLE':
+        print(verdict)
         return False
-    with open(dotfname, 'w') as fout:
-        fout.write('\n'.join(ret[1:]))
+    # strixはKISSだけ出力する. DOTはgraphviz用
+    with instrument.span('load_kiss'):
+        graph = kiss.load_kiss(kissfname)
+        if spec is not None and spec.encoding != DEFAULT_ENCODING:
+            # 他のツールはone-hotの出力を読むので, strixの出力を書き換える
+            graph = spec.one_hot(graph)
+            with open(kissfname, 'w') as fout:
+                kiss.write_kiss(graph, fout)
+    if minimize_automaton:
+        with instrument.span('minimize') as attrs:
+            graph = minimize(graph, len(ins))
+            attrs['states'] = len(graph)
+    # 前回と同じ振る舞いで状態も多くないならDOTとSVGを作り直さない
+    # (最小化前のstrixの出力なら最小化したものに置き換える)
+    with instrument.span('compare'):
+        old = demo4_play.load_dot(dotfname) if os.path.exists(dotfname) else {}
+        same = False
+        if old and all(len(c) == len(ins) for edges in old.values() for c, _, _ in edges) and count(old) <= count(graph):
+            same = distinguish(automaton.compile_graph(graph, len(ins)), automaton.compile_graph(old, len(ins))) is None
+    if same:
+        print('REALIZABLE (same controller as {0})'.format(dotfname))
+        return True
+    with instrument.span('write_dot'), open(dotfname, 'w') as fout:
+        kiss.write_dot(graph, fout)
     # newdotfname = 'h_' + dotfname
     # convert_dot(dotfname, newdotfname)
     newdotfname = dotfname
-    p = subprocess.run([
-        'dot', '-Tsvg', '-o{}'.format(svgfname), newdotfname], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    # print(p.stdout.decode('utf-8'))
+    # svgは裏で作る. 終わるのを待つのはmainの最後
+    if render_svg:
+        renderer.submit(newdotfname, svgfname)
     print('REALIZABLE')
     return True
 
-def check_assumptions(assumptions, fname, dotfname, svgfname):
-    make_spec(assumptions, [(-1, '(err && !err)')], fname)
-    p = subprocess.run([
-        '/strix/bin/strix', '--kiss',
-        # '--minimize',
-        '--dot', fname,
-        '--ins=' + ','.join(ins),
-        '--outs=err,' + ','.join(outs),
-    ], stdout=subprocess.PIPE)
-    stdout = p.stdout.decode('utf-8')
-    ret = stdout.split('\n')
-    if ret[0] != 'UNREALIZABLE':
+# assumptionsだけで矛盾していないか確認するためのguarantee
+err_guarantees = [(-1, And('err', Not('err')))]
+
+def check_assumptions(assumptions, ins, outs, dotfname, svgfname):
+    verdict = run_strix(spec_writer(assumptions, err_guarantees), ins, ['err'] + outs, purpose='assumptions')
+    if verdict != 'UNREALIZABLE':
         print('invalid assumptions')
         return False
     return True
 
 
+def realizable(assumptions, guarantees, ins, outs):
+    verdict = run_strix(spec_writer(assumptions, guarantees), ins, outs, purpose='guarantees')
+    print(len(guarantees), verdict)
+    return verdict == 'REALIZABLE'
+
+def assumptions_valid(assumptions, ins, outs):
+    verdict = run_strix(spec_writer(assumptions, err_guarantees), ins, ['err'] + outs, purpose='assumptions')
+    print(len(assumptions), verdict)
+    return verdict == 'UNREALIZABLE'
+
+def guarantee_jobs(assumptions, base, targets, ng, ins, outs):
+    for cmb in itertools.combinations(targets, ng):
+        yield cmb, spec_writer(assumptions, base + list(cmb)), ins, outs
+
+def assumption_jobs(base, targets, ng, ins, outs):
+    for cmb in itertools.combinations(targets, ng):
+        yield cmb, spec_writer(base + list(cmb), err_guarantees), ins, ['err'] + outs
+
 def main():
+    with instrument.span('spec'):
+        spec = ElevatorSpec(N, M, TL, counter, load_encoding(N, M))
+    assumptions, guarantees, ins, outs = spec.assumptions, spec.guarantees, spec.ins, spec.outs
+    print('ins=', ins)
+    print('outs=', outs)
     print("START")
-    if check_assumptions(assumptions, 'examples/demo4_4f.txt', 'examples/demo4_4f.dot', 'examples/demo4_4f.svg'):
-        if check_guarantees(assumptions, guarantees, 'examples/demo4_4f.txt', 'examples/demo4_4f.dot', 'examples/demo4_4f.svg'):
+    with instrument.span('simplify'):
+        sa, sg = simplify_spec(assumptions, guarantees)
+    # strixにはstdinで渡すので, ここで保存するのは確認用
+    with instrument.span('make_spec'):
+        make_spec(sa, sg, 'examples/demo4_4f.txt')
+    with instrument.span('check_assumptions'):
+        valid = check_assumptions(sa, ins, outs, 'examples/demo4_4f.dot', 'examples/demo4_4f.svg')
+    if valid:
+        with instrument.span('check_guarantees'):
+            ok = check_guarantees(sa, sg, ins, outs, 'examples/demo4_4f.kiss', 'examples/demo4_4f.dot', 'examples/demo4_4f.svg', spec)
+        if ok:
             print('Full specification is realizable')
             return
         print('find wrong guarantee ver>{0}'.format(verified_ver))
         base = [v for v in guarantees if v[0] <= verified_ver]
         targets = [v for v in guarantees if v[0] > verified_ver]
-        for ng in range(1, len(targets) + 1):
-            print('=' * 80)
-            print(ng)
-            for cmb in itertools.combinations(targets, ng):
-                print(cmb)
-                if not check_guarantees(assumptions, base + list(cmb), 'examples/demo4_4f.txt', 'examples/demo4_4f.dot', 'examples/demo4_4f.svg'):
-                    return
+        if find_mode == 'core':
+            with instrument.span('search', mode='core'):
+                # 全体がUNREALIZABLEなのは確認済み
+                core = quickxplain(base, targets, lambda gs: realizable(assumptions, gs, ins, outs), inconsistent=True)
+            print('core=', core)
+            return
+        with strix.Pool(timeout=strix_timeout, max_memory=strix_memory, cache=cache) as pool:
+            for ng in range(1, len(targets) + 1):
+                print('=' * 80)
+                print(ng)
+                with instrument.span('search', mode='combination', ng=ng) as attrs:
+                    attrs['jobs'] = 0
+                    for cmb, verdict in pool.imap(guarantee_jobs(assumptions, base, targets, ng, ins, outs)):
+                        attrs['jobs'] += 1
+                        answer(verdict, 'guarantees {0}'.format(cmb))
+                        print(cmb)
+                        print(verdict)
+                        if verdict == 'UNREALIZABLE':
+                            return
     else:
         print('find wrong assumption ver>{0}'.format(verified_ver))
         base = [v for v in assumptions if v[0] <= verified_ver]
         targets = [v for v in assumptions if v[0] > verified_ver]
-        for ng in range(1, len(targets) + 1):
-            print('=' * 80)
-            print(ng)
-            for cmb in itertools.combinations(targets, ng):
-                print(cmb)
-                if not check_assumptions(base + list(cmb), 'examples/demo4_4f.txt', 'examples/demo4_4f.dot', 'examples/demo4_4f.svg'):
-                    return
+        if find_mode == 'core':
+            with instrument.span('search', mode='core'):
+                core = quickxplain(base, targets, lambda asm: assumptions_valid(asm, ins, outs), inconsistent=True)
+            print('core=', core)
+            return
+        with strix.Pool(timeout=strix_timeout, max_memory=strix_memory, cache=cache) as pool:
+            for ng in range(1, len(targets) + 1):
+                print('=' * 80)
+                print(ng)
+                with instrument.span('search', mode='combination', ng=ng) as attrs:
+                    attrs['jobs'] = 0
+                    for cmb, verdict in pool.imap(assumption_jobs(base, targets, ng, ins, outs)):
+                        attrs['jobs'] += 1
+                        answer(verdict, 'assumptions {0}'.format(cmb))
+                        print(cmb)
+                        if verdict == 'REALIZABLE':
+                            print('invalid assumptions')
+                            return
+
+def write_profile():
+    report = instrument.recorder.report()
+    if profile:
+        print('-' * 80)
+        instrument.print_tree(report)
+    if profile_file is not None:
+        instrument.recorder.dump(profile_file)
+        print('profile written to', profile_file)
 
 if __name__ == '__main__':
-    main()
+    try:
+        with instrument.span('demo4'):
+            try:
+                main()
+            except NoVerdict as e:
+                print(e)
+                sys.exit(1)
+            finally:
+                with instrument.span('render_wait'):
+                    renderer.wait()
+    finally:
+        write_profile()
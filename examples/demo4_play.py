@@ -1,45 +1,27 @@
+import argparse
+import asyncio
 import collections
-import re
+import json
+import os
 import itertools
 import sys
+import termios
 import time
+import tty
 
-N = 4
+import automaton
+import instrument
+import kiss
+import lazydot
+from minimize import minimize
 
 def load_dot(dotfile):
-    ptn1 = re.compile('(\d+) -> (\d+) \[(.+)\];\n')
-    ptn2 = re.compile(r'label="(?P<label>([-\d]+/[-\d]+\\l)+)"')
     graph = collections.defaultdict(list)
     with open(dotfile) as f:
         for l in f:
-            mo1 = ptn1.match(l)
-            if mo1 is None:
-                continue
-            node_from, node_to, meta = mo1.groups()
-            node_from, node_to = int(node_from), int(node_to)
-            mo2 = ptn2.match(meta)
-            if mo2 is None:
-                continue
-            label = mo2.groupdict()['label']
-            for s in label.split('\l'):
-                if s.strip() == '':
-                    break
-                ins_v, outs_v = s.split('/')
-                ins_cond = []
-                outs_signal = []
-                for v in ins_v:
-                    if v != '-':
-                        v = int(v)
-                    else:
-                        v = -1
-                    ins_cond.append(v)
-                for v in outs_v:
-                    if v != '-':
-                        v = int(v)
-                    else:
-                        v = -1
-                    outs_signal.append(v)
-                graph[node_from].append((ins_cond, outs_signal, node_to))
+            parsed = kiss.parse_edges(l)
+            if parsed is not None:
+                graph[parsed[0]].extend(parsed[1])
     return graph
 
 def match(ins_cond, ins_v):
@@ -50,9 +32,9 @@ def match(ins_cond, ins_v):
             return False
     return True
 
-def convert_input(x):
+def convert_input(x, n_ins):
     if x == '':
-        return [0] * N
+        return [0] * n_ins
     ins_v = []
     for c in x:
         ins_v.append(int(c))
@@ -64,8 +46,79 @@ def print_spinner():
         time.sleep(0.008)
         print(spinner + '\033[1D', end='', file=sys.stderr, flush=True)
 
-def play(graph):
-    cur = 0
+def load_graph(fname, minimize_graph=False):
+    """
+    edges of the controller in DOT or KISS file fname, with equivalent nodes merged if minimize_graph
+    """
+    graph = kiss.load_kiss(fname) if fname.endswith('.kiss') else load_dot(fname)
+    if minimize_graph:
+        graph = minimize(graph, kiss.n_inputs(graph))
+    return graph
+
+def load_table(fname, lazy=False, minimize_graph=False):
+    """
+    load controller from DOT, KISS or binary file written by automaton.export, the nodes are those of the file.
+    the number of inputs (floors) is taken from the file.
+    lazy reads a DOT node by node as it is stepped, minimize_graph merges equivalent nodes of a DOT or KISS
+    first (demo4.py already writes the minimized DOT).
+    """
+    if lazy and fname.endswith('.dot'):
+        return lazydot.LazyTable(fname)
+    if fname.endswith(('.dot', '.kiss')):
+        graph = load_graph(fname, minimize_graph)
+        return automaton.compile_graph(graph, kiss.n_inputs(graph))
+    return automaton.load(fname)
+
+class Timed(object):
+    """
+    table whose step() records its latency in ns (with the cost of reading the clock) in histogram
+    'step_ns' of instrument.recorder, and in 'edge_scans' how many guards scanning the edges of the node
+    in order would test (the tables do one lookup instead). edges are taken from graph, a MappedTable or
+    a LazyTable (which does scan).
+    """
+    def __init__(self, table, graph=None):
+        self.table = table
+        self.n_ins = table.n_ins
+        self.start = table.start
+        self.latency = instrument.recorder.histogram('step_ns')
+        self.scans = instrument.recorder.histogram('edge_scans')
+        self.guards = None
+        if graph is not None:
+            n_nodes = max(graph) + 1 if graph else 0
+            self.guards = [[automaton.guard(c) for c, _, _ in graph.get(n, [])] for n in range(n_nodes)]
+        elif getattr(table, 'offsets', None) is not None:
+            o = table.offsets
+            self.guards = [list(zip(table.care[o[n]:o[n + 1]], table.value[o[n]:o[n + 1]])) for n in range(table.n_nodes)]
+        self.lazy = isinstance(table, lazydot.LazyTable)
+
+    def step(self, cur, x):
+        t0 = time.perf_counter_ns()
+        step = self.table.step(cur, x)
+        self.latency.add(time.perf_counter_ns() - t0)
+        if self.guards is not None:
+            self.scans.add(scans(self.guards[cur] if cur < len(self.guards) else (), x))
+        elif self.lazy:
+            # stepしたばかりなのでcacheにある
+            self.scans.add(scans(self.table.cache[cur], x))
+        return step
+
+def scans(edges, x):
+    """
+    number of edges (care, value, ...) tested until one matches input x
+
+    >>> scans([(1, 1), (1, 0), (0, 0)], 2)
+    2
+    """
+    n = 0
+    for e in edges:
+        n += 1
+        if x & e[0] == e[1]:
+            break
+    return n
+
+def play(table):
+    N = table.n_ins
+    cur = table.start
     inp = 1
     for cnt in itertools.count():
         first = cnt == 0
@@ -74,20 +127,51 @@ def play(graph):
         else:
             print(f"\033[{inp}B", end="", flush=True)
             x = input('>')
-            ins_v = convert_input(x)
+            ins_v = convert_input(x, N)
             if sum(ins_v) == 0:
                 print_spinner()
             else:
                 inp += 1
-        for ins_cond, outs_signal, node_to in graph[cur]:
-            if match(ins_cond, ins_v):
-                cur = node_to
-                viz2(outs_signal, inp, first)
-                break
-        else:
+        step = table.step(cur, automaton.pack(ins_v))
+        if step is None:
             print('Invalid input, your input break the assumption.', ins_v)
+            continue
+        cur, outs_signal = step
+        viz2(outs_signal, inp, first, N)
 
-def viz2(outs_signal, inp, first):
+BATCH = 4096
+
+def replay(table, fin, fout):
+    """
+    step table with every line of fin (input vectors as for play, empty is all 0) without
+    rendering and write one JSON line per step to fout:
+    {"step": k, "state": node after the step, "outputs": [...], "violation": false}.
+    if the input breaks the assumption outputs is null, violation is true and the state does not change.
+    """
+    cur = table.start
+    xs = {}
+    outs = {}
+    buf = []
+    for k, l in enumerate(fin):
+        l = l.strip()
+        x = xs.get(l)
+        if x is None:
+            x = xs[l] = automaton.pack(convert_input(l, table.n_ins))
+        step = table.step(cur, x)
+        if step is None:
+            buf.append('{{"step": {0}, "state": {1}, "outputs": null, "violation": true}}\n'.format(k, cur))
+        else:
+            cur, sig = step
+            s = outs.get(sig)
+            if s is None:
+                s = outs[sig] = json.dumps(list(sig))
+            buf.append('{{"step": {0}, "state": {1}, "outputs": {2}, "violation": false}}\n'.format(k, cur, s))
+        if len(buf) >= BATCH:
+            fout.write(''.join(buf))
+            buf = []
+    fout.write(''.join(buf))
+
+def viz2(outs_signal, inp, first, N):
     data = []
     states = {
         'no'    : '[{go}]|      |',
@@ -114,10 +198,164 @@ def viz2(outs_signal, inp, first):
                         data.append(states[n].format(go=go[i]))
                         break
     if not first:
-        print(f"\033[{5+inp}A", end="", flush=True)
+        print(f"\033[{N+1+inp}A", end="", flush=True)
     print('-----------' + '\n'  + '\n'.join(reversed(data)), flush=True)
 
 
+CELLS = {
+    'no':   '      ',
+    'stop': '  ][  ',
+    'up':   '  ↑   ',
+    'down': '  ↓   ',
+    'open': ']    [',
+}
+KEYS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def frame(outs_signal, n_floors, n_lifts, pending=(), status=''):
+    """
+    rows of the building for outs_signal (outs order of demo4.py), top floor first.
+    each row has the go flag, the pending key presses and one cell per lift.
+
+    >>> for row in frame([0, 1, 1, 0] + [1, 0, 0, 1, 0, 0] + [1, 0] + [0, 1], 2, 2, {1}): print(row)
+    ----------------------
+    [o]* 1 |]    [|      |
+    [ ]  0 |      |  ][  |
+    <BLANKLINE>
+    """
+    N, M = n_floors, n_lifts
+    move = outs_signal[N * M:N * M + 3 * M]
+    opn = outs_signal[N * M + 3 * M:N * M + 4 * M]
+    go = outs_signal[N * M + 4 * M:N * M + 4 * M + N]
+    rows = ['-' * (7 + 7 * M + 1)]
+    for i in reversed(range(N)):
+        cells = []
+        for j in range(M):
+            if outs_signal[j * N + i] != 1:
+                cells.append(CELLS['no'])
+            elif opn[j] == 1:
+                cells.append(CELLS['open'])
+            else:
+                # -1はdon't careなので最初のものにする
+                k = next((k for k in range(3) if move[3 * j + k] != 0), 0)
+                cells.append(CELLS[('stop', 'up', 'down')[k]])
+        rows.append('[{0}]{1}{2:>2s} |{3}|'.format(
+            'o' if go[i] == 1 else ' ', '*' if i in pending else ' ', KEYS[i], '|'.join(cells)))
+    rows.append(status)
+    return rows
+
+class Screen(object):
+    """
+    Terminal which keeps the last frame and rewrites only the rows that changed, in one write.
+    """
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.prev = []
+
+    def draw(self, rows):
+        buf = []
+        for r, row in enumerate(rows):
+            if r >= len(self.prev) or self.prev[r] != row:
+                buf.append('\033[{0};1H{1}\033[K'.format(r + 1, row))
+        for r in range(len(rows), len(self.prev)):
+            buf.append('\033[{0};1H\033[K'.format(r + 1))
+        self.prev = list(rows)
+        if buf:
+            self.out.write(''.join(buf))
+            self.out.flush()
+
+async def live(table, n_lifts=1, tick=0.5, fps=30):
+    """
+    run the controller in real time, one step every tick seconds and at most fps frames per second.
+    keys 0-9, a-z request the floor at the next step, q quits.
+    """
+    N, M = table.n_ins, n_lifts
+    loop = asyncio.get_running_loop()
+    fd = sys.stdin.fileno()
+    pending = set()
+    done = asyncio.Event()
+    state = {'cur': table.start, 'sig': None, 'steps': 0, 'note': '', 'dirty': True}
+
+    def on_key():
+        for c in os.read(fd, 64).decode('utf-8', 'ignore'):
+            if c == 'q':
+                done.set()
+            elif c in KEYS[:N]:
+                pending.add(KEYS.index(c))
+                state['dirty'] = True
+
+    async def ticker():
+        x = 0  # 最初はどこも要求していない
+        while True:
+            step = table.step(state['cur'], x)
+            if step is None:
+                state['note'] = 'input breaks the assumption'
+            else:
+                state['cur'], state['sig'] = step
+                state['note'] = ''
+            state['steps'] += 1
+            state['dirty'] = True
+            await asyncio.sleep(tick - loop.time() % tick)
+            x = sum(1 << i for i in pending)
+            pending.clear()
+
+    async def drawer():
+        screen = Screen()
+        while True:
+            if state['dirty'] and state['sig'] is not None:
+                state['dirty'] = False
+                screen.draw(frame(state['sig'], N, M, pending, 'step {0} {1}'.format(state['steps'], state['note'])))
+            await asyncio.sleep(1 / fps)
+
+    saved = termios.tcgetattr(fd)
+    tty.setcbreak(fd)
+    sys.stdout.write('\033[2J\033[?25l')
+    loop.add_reader(fd, on_key)
+    tasks = [asyncio.ensure_future(ticker()), asyncio.ensure_future(drawer())]
+    try:
+        await done.wait()
+    finally:
+        for t in tasks:
+            t.cancel()
+        loop.remove_reader(fd)
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        sys.stdout.write('\033[?25h\n')
+
+
 if __name__ == '__main__':
-    graph = load_dot('demo4_4f.dot')
-    play(graph)
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('automaton', nargs='?', default='demo4_4f.dot')
+    parser.add_argument('--replay', metavar='FILE', help="read input vectors from FILE ('-' for stdin) and write JSON lines to stdout")
+    parser.add_argument('--live', action='store_true', help='real time display, keys request floors')
+    parser.add_argument('--lifts', type=int, default=1)
+    parser.add_argument('--tick', type=float, default=0.5, help='seconds per step in --live')
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--profile', metavar='FILE', help='write step latency and edge scan histograms as JSON to FILE')
+    parser.add_argument('--lazy', action='store_true', help='decode the nodes of a large DOT file when they are first visited')
+    parser.add_argument('--minimize', action='store_true', help='merge equivalent states first, states then differ from the file')
+    args = parser.parse_args()
+    if args.profile is None:
+        table = load_table(args.automaton, args.lazy, args.minimize)
+    else:
+        with instrument.span('load', automaton=args.automaton):
+            graph = None
+            if args.lazy:
+                table = load_table(args.automaton, lazy=True)
+            elif args.automaton.endswith(('.dot', '.kiss')):
+                graph = load_graph(args.automaton, args.minimize)
+                table = automaton.compile_graph(graph, kiss.n_inputs(graph))
+            else:
+                table = automaton.load(args.automaton)
+        table = Timed(table, graph)
+    try:
+        if args.live:
+            asyncio.run(live(table, args.lifts, args.tick, args.fps))
+        elif args.replay is None:
+            play(table)
+        elif args.replay == '-':
+            replay(table, sys.stdin, sys.stdout)
+        else:
+            with open(args.replay) as fin:
+                replay(table, fin, sys.stdout)
+    finally:
+        if args.profile is not None:
+            instrument.recorder.dump(args.profile)
@@ -0,0 +1,80 @@
+"""
+Compare the input/output behavior of two controllers.
+
+Breadth first search over pairs of nodes of the two transition tables, every
+step tries each packed input bit vector. The first pair which disagrees gives
+the shortest input trace telling them apart.
+
+    python equiv.py old.dot demo4_4f.dot
+"""
+import collections
+import sys
+
+import automaton
+import demo4_play
+
+
+def distinguish(a, b):
+    """
+    return None if tables a and b behave the same, otherwise (inputs, step_a, step_b):
+    the shortest list of input bit vectors after which they differ and the last step of each
+    ((node_to, outs) or None if the input breaks the assumption).
+
+    >>> a = automaton.compile_graph({0: [([-1], [0], 1)], 1: [([-1], [1], 0)]}, 1)
+    >>> b = automaton.compile_graph({0: [([-1], [0], 1)], 1: [([0], [1], 0), ([1], [0], 0)]}, 1)
+    >>> distinguish(a, a)
+    >>> distinguish(a, b)
+    ([0, 1], (0, (1,)), (0, (0,)))
+    """
+    assert a.n_ins == b.n_ins
+    width = 1 << a.n_ins
+    start = (a.start, b.start)
+    parent = {start: None}
+    queue = collections.deque([start])
+    while queue:
+        pair = queue.popleft()
+        na, nb = pair
+        for x in range(width):
+            sa, sb = a.step(na, x), b.step(nb, x)
+            if (sa is None) != (sb is None) or (sa is not None and sa[1] != sb[1]):
+                trace = [x]
+                while parent[pair] is not None:
+                    pair, x = parent[pair]
+                    trace.append(x)
+                return trace[::-1], sa, sb
+            if sa is None:
+                continue
+            nxt = (sa[0], sb[0])
+            if nxt not in parent:
+                parent[nxt] = (pair, x)
+                queue.append(nxt)
+    return None
+
+
+def unpack(x, n_ins):
+    """
+    >>> unpack(13, 4)
+    [1, 0, 1, 1]
+    """
+    return [(x >> i) & 1 for i in range(n_ins)]
+
+
+def main():
+    a = demo4_play.load_table(sys.argv[1])
+    b = demo4_play.load_table(sys.argv[2])
+    d = distinguish(a, b)
+    if d is None:
+        print('equivalent')
+        return
+    trace, sa, sb = d
+    print('different after {0} steps'.format(len(trace)))
+    for k, x in enumerate(trace):
+        print('  {0:3d} {1}'.format(k, ''.join(map(str, unpack(x, a.n_ins)))))
+    for fname, step in ((sys.argv[1], sa), (sys.argv[2], sb)):
+        print('  {0}: {1}'.format(fname, 'breaks the assumption' if step is None else
+                                  ''.join('-' if v == -1 else str(v) for v in step[1])))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Nested timing spans, counters and histograms of a run.
+
+Every span records wall time, cpu time of its thread, cpu time of child
+processes (process wide, like bench.py) and the peak RSS. Spans opened
+inside a span are its children, spans of other threads (e.g. render.py) are
+separate roots.
+
+    with instrument.span('strix', purpose='guarantees') as attrs:
+        strix.run(..., stats=attrs)   # the attributes of the span
+    instrument.recorder.histogram('step_ns').add(ns)
+
+The report is JSON. It can be converted to collapsed stacks for flamegraph.pl
+or speedscope, or to the Chrome trace format (chrome://tracing, Perfetto):
+
+    python instrument.py demo4_profile.json
+    python instrument.py demo4_profile.json --folded demo4.folded --chrome demo4.trace.json
+"""
+import argparse
+import collections
+import contextlib
+import json
+import resource
+import sys
+import threading
+import time
+
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+
+
+class Histogram(object):
+    """
+    counts of non negative ints in power of two buckets, bucket k has the values with bit_length() == k.
+    buckets are reported by their largest value.
+
+    >>> h = Histogram()
+    >>> for v in (0, 1, 3, 5, 1000):
+    ...     h.add(v)
+    >>> h.report()
+    {'count': 5, 'sum': 1009, 'min': 0, 'max': 1000, 'p50': 3, 'p99': 1000, 'buckets': {'0': 1, '1': 1, '3': 1, '7': 1, '1023': 1}}
+    """
+    def __init__(self):
+        self.buckets = [0] * 65
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def add(self, v):
+        self.buckets[v.bit_length()] += 1
+        self.count += 1
+        self.sum += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+    def percentile(self, p):
+        """
+        upper bound of the p-th percentile (0 <= p <= 100), None if empty
+        """
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min((1 << k) - 1, self.max)
+
+    def report(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': {str((1 << k) - 1): n for k, n in enumerate(self.buckets) if n},
+        }
+
+
+class Recorder(object):
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.roots = []
+        self.counters = collections.Counter()
+        self.histograms = {}
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """
+        time the with block, attrs (yielded, may be updated in the block) are stored with the span
+        """
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        node = {
+            'name': name,
+            'thread': threading.current_thread().name,
+            'start': time.perf_counter() - self.t0,
+            'attrs': attrs,
+            'children': [],
+        }
+        if stack:
+            stack[-1]['children'].append(node)
+        else:
+            with self.lock:
+                self.roots.append(node)
+        stack.append(node)
+        own0 = resource.getrusage(RUSAGE_THREAD)
+        child0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            node['wall'] = time.perf_counter() - t0
+            own1 = resource.getrusage(RUSAGE_THREAD)
+            child1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+            node['cpu'] = (own1.ru_utime - own0.ru_utime) + (own1.ru_stime - own0.ru_stime)
+            node['child_cpu'] = (child1.ru_utime - child0.ru_utime) + (child1.ru_stime - child0.ru_stime)
+            node['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            stack.pop()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def histogram(self, name):
+        with self.lock:
+            h = self.histograms.get(name)
+            if h is None:
+                h = self.histograms[name] = Histogram()
+            return h
+
+    def report(self):
+        with self.lock:
+            return {
+                'spans': list(self.roots),
+                'counters': dict(self.counters),
+                'histograms': {name: h.report() for name, h in self.histograms.items()},
+            }
+
+    def dump(self, fname):
+        with open(fname, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+
+# 1プロセスに1つ
+recorder = Recorder()
+span = recorder.span
+
+
+def walk(spans, path=()):
+    """
+    iterate (path of names, span) depth first
+    """
+    for s in spans:
+        p = path + (s['name'],)
+        yield p, s
+        yield from walk(s['children'], p)
+
+
+def folded(report):
+    """
+    collapsed stacks (thread;span;...;span self-time-in-microseconds) for flamegraph.pl
+
+    >>> r = {'spans': [{'name': 'a', 'thread': 'MainThread', 'wall': 0.003, 'children': [
+    ...     {'name': 'b', 'thread': 'MainThread', 'wall': 0.002, 'children': []}]}]}
+    >>> print(folded(r), end='')
+    MainThread;a 1000
+    MainThread;a;b 2000
+    """
+    lines = []
+    for path, s in walk(report['spans']):
+        if 'wall' not in s:
+            continue
+        own = s['wall'] - sum(c.get('wall', 0) for c in s['children'])
+        us = round(own * 1e6)
+        if us > 0:
+            lines.append('{0};{1} {2}\n'.format(s['thread'], ';'.join(path), us))
+    return ''.join(lines)
+
+
+def chrome(report):
+    """
+    report as a Chrome trace (complete events, one track per thread)
+    """
+    tids = {}
+    events = []
+    for _, s in walk(report['spans']):
+        if 'wall' not in s:
+            continue
+        tid = tids.setdefault(s['thread'], len(tids))
+        args = dict(s['attrs'], cpu=s['cpu'], child_cpu=s['child_cpu'], maxrss=s['maxrss'])
+        events.append({'name': s['name'], 'ph': 'X', 'pid': 0, 'tid': tid,
+                       'ts': s['start'] * 1e6, 'dur': s['wall'] * 1e6, 'args': args})
+    for thread, tid in tids.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': tid, 'args': {'name': thread}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def print_tree(report, out=sys.stdout):
+    for path, s in walk(report['spans']):
+        if 'wall' not in s:
+            continue
+        attrs = ' '.join('{0}={1}'.format(k, v if not isinstance(v, float) else round(v, 4)) for k, v in s['attrs'].items())
+        print('{0:32s} {1:9.4f}s  cpu {2:8.4f}s  child cpu {3:8.4f}s  {4}'.format(
+            '  ' * (len(path) - 1) + s['name'], s['wall'], s['cpu'], s['child_cpu'], attrs).rstrip(), file=out)
+    for name, n in sorted(report['counters'].items()):
+        print('{0:32s} {1}'.format(name, n), file=out)
+    for name, h in sorted(report['histograms'].items()):
+        print('{0:32s} count {count} min {min} p50 {p50} p99 {p99} max {max}'.format(name, **h), file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('report', help='JSON written by Recorder.dump')
+    parser.add_argument('--folded', metavar='FILE', help='write collapsed stacks for flamegraph.pl')
+    parser.add_argument('--chrome', metavar='FILE', help='write Chrome trace JSON')
+    args = parser.parse_args()
+    with open(args.report) as f:
+        report = json.load(f)
+    if args.folded is None and args.chrome is None:
+        print_tree(report)
+    if args.folded is not None:
+        with open(args.folded, 'w') as f:
+            f.write(folded(report))
+    if args.chrome is not None:
+        with open(args.chrome, 'w') as f:
+            json.dump(chrome(report), f)
+
+
+if __name__ == '__main__':
+    main()
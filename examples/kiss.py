@@ -0,0 +1,174 @@
+"""
+Read the KISS2 machine printed by `strix --kiss`.
+
+    .i 4
+    .o 12
+    .r 0
+    0000 0 1 100010000000
+    ...
+
+Each line is `inputs state next_state outputs`, '-' is don't care.
+The result has the same structure as demo4_play.load_dot.
+The edge lines of the DOT files written by strix or write_dot are parsed here too.
+"""
+import collections
+import re
+
+EDGE_RE = re.compile(r'(\d+) -> (\d+) \[(.+)\];\n')
+LABEL_RE = re.compile(r'label="(?P<label>([-\d]+/[-\d]+\\l)+)"')
+
+
+def _signal(s):
+    return [-1 if c == '-' else int(c) for c in s]
+
+
+def _label(signal):
+    return ''.join('-' if v == -1 else str(v) for v in signal)
+
+
+def read_kiss(lines):
+    """
+    build graph from KISS2 lines, the reset state is node 0.
+    numeric state names are kept if the reset state is 0, otherwise states are numbered in order of appearance.
+
+    >>> g = read_kiss(['.i 2', '.o 1', '.r 0', '1- 0 1 1', '0- 0 0 0', '-- 1 0 -', '.e'])
+    >>> dict(g)
+    {0: [([1, -1], [1], 1), ([0, -1], [0], 0)], 1: [([-1, -1], [-1], 0)]}
+
+    >>> dict(read_kiss(['.r s1', '1 s1 s0 1', '0 s0 s1 0']))
+    {0: [([1], [1], 1)], 1: [([0], [0], 0)]}
+    """
+    graph = collections.defaultdict(list)
+    reset = None
+    names = {}
+
+    def node(name):
+        n = names.get(name)
+        if n is None:
+            n = names[name] = len(names)
+        return n
+
+    numeric = None
+    for l in lines:
+        l = l.strip()
+        if l == '' or l.startswith('#'):
+            continue
+        if l.startswith('.'):
+            words = l.split()
+            if words[0] == '.r':
+                reset = words[1]
+            elif words[0] == '.e':
+                break
+            continue
+        ins_v, state, next_state, outs_v = l.split()
+        if numeric is None:
+            numeric = (reset is None or reset == '0') and state.isdigit()
+            if not numeric and reset is not None:
+                node(reset)
+        if numeric:
+            node_from, node_to = int(state), int(next_state)
+        else:
+            node_from, node_to = node(state), node(next_state)
+        graph[node_from].append((_signal(ins_v), _signal(outs_v), node_to))
+    return graph
+
+
+def load_kiss(kissfile):
+    with open(kissfile) as f:
+        return read_kiss(f)
+
+
+def parse_edges(l):
+    """
+    (node_from, [(ins_cond, outs_signal, node_to), ...]) of an edge line of a DOT file, None for other lines
+
+    >>> parse_edges('0 -> 1 [label="1-/1\\\\l0-/0\\\\l"];\\n')
+    (0, [([1, -1], [1], 1), ([0, -1], [0], 1)])
+    >>> parse_edges('0 [label="0"];\\n')
+    """
+    mo1 = EDGE_RE.match(l)
+    if mo1 is None:
+        return None
+    node_from, node_to, meta = mo1.groups()
+    node_from, node_to = int(node_from), int(node_to)
+    mo2 = LABEL_RE.match(meta)
+    if mo2 is None:
+        return None
+    edges = []
+    for s in mo2.groupdict()['label'].split('\\l'):
+        if s.strip() == '':
+            break
+        ins_v, outs_v = s.split('/')
+        edges.append((_signal(ins_v), _signal(outs_v), node_to))
+    return node_from, edges
+
+
+def n_inputs(graph):
+    """
+    number of inputs of graph, the width of its guards (0 without edges)
+
+    >>> n_inputs({0: [([1, -1, 0], [1], 0)]})
+    3
+    """
+    for edges in graph.values():
+        for ins_cond, _, _ in edges:
+            return len(ins_cond)
+    return 0
+
+
+def write_kiss(graph, fout, start=0):
+    """
+    write graph as KISS2, read_kiss reads it back
+
+    >>> import io
+    >>> g = {0: [([1, -1], [1], 1), ([0, -1], [0], 0)], 1: [([-1, -1], [-1], 0)]}
+    >>> buf = io.StringIO()
+    >>> write_kiss(g, buf)
+    >>> print(buf.getvalue(), end='')
+    .i 2
+    .o 1
+    .r 0
+    1- 0 1 1
+    0- 0 0 0
+    -- 1 0 -
+    .e
+    >>> dict(read_kiss(buf.getvalue().splitlines())) == g
+    True
+    """
+    edges = [(node_from, e) for node_from in sorted(graph) for e in graph[node_from]]
+    n_ins = n_inputs(graph)
+    n_outs = len(edges[0][1][1]) if edges else 0
+    fout.write('.i {0}\n.o {1}\n.r {2}\n'.format(n_ins, n_outs, start))
+    for node_from, (ins_cond, outs_signal, node_to) in edges:
+        fout.write('{0} {1} {2} {3}\n'.format(_label(ins_cond), node_from, node_to, _label(outs_signal)))
+    fout.write('.e\n')
+
+
+def write_dot(graph, fout, start=0):
+    """
+    write graph in the same layout as `strix --dot` so load_dot and graphviz can read it
+
+    >>> import io
+    >>> buf = io.StringIO()
+    >>> write_dot({0: [([1, -1], [1], 1), ([0, -1], [0], 1)]}, buf)
+    >>> print(buf.getvalue().splitlines()[-2])
+    0 -> 1 [label="1-/1\\l0-/0\\l"];
+    """
+    nodes = set(graph)
+    for edges in graph.values():
+        nodes.update(node_to for _, _, node_to in edges)
+    fout.write('digraph "" {\n')
+    fout.write('graph [rankdir=LR,ranksep=0.8,nodesep=0.2];\n')
+    fout.write('node [shape=circle];\n')
+    fout.write('edge [fontname=mono];\n')
+    fout.write('init [shape=point,style=invis];\n')
+    for n in sorted(nodes):
+        fout.write('{0} [label="{0}"];\n'.format(n))
+    fout.write('init -> {0} [penwidth=0,tooltip="initial state"];\n'.format(start))
+    for node_from in sorted(graph):
+        labels = collections.OrderedDict()
+        for ins_cond, outs_signal, node_to in graph[node_from]:
+            labels.setdefault(node_to, []).append('{0}/{1}\\l'.format(_label(ins_cond), _label(outs_signal)))
+        for node_to, ls in labels.items():
+            fout.write('{0} -> {1} [label="{2}"];\n'.format(node_from, node_to, ''.join(ls)))
+    fout.write('}\n')
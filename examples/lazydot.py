@@ -0,0 +1,205 @@
+"""
+Step a controller in a DOT file without loading the whole file.
+
+One pass over the memory-mapped DOT file finds where the edge lines of each
+node are. `python lazydot.py` saves the index next to the DOT as `<dot>.idx`,
+it is used while the DOT keeps its size and mtime. A node's edges are decoded when the
+controller first reaches it, and at most cache_size decoded nodes are kept
+(least recently used are dropped), so memory grows with the states a trace
+visits instead of with the file.
+
+    table = LazyTable('demo4_4f.dot')
+    table.step(table.start, 0)
+
+    python lazydot.py big.dot     # build and save the index
+"""
+import array
+import bisect
+import collections
+import mmap
+import os
+import re
+import struct
+import sys
+
+import automaton
+import kiss
+import strix
+
+NODE_RE = re.compile(rb'^(\d+) -> ', re.M)
+
+# index file, native byte order
+#   header : magic, version, n_runs, DOT size, DOT mtime_ns
+#   node   : uint64[n_runs] sorted, a node has several runs if its edge lines are not together
+#   start  : uint64[n_runs] byte offsets of the run in the DOT
+#   end    : uint64[n_runs]
+MAGIC = b'ELVI'
+VERSION = 1
+HEADER = struct.Struct('=4sIQQQ')
+CACHE_SIZE = 4096
+
+
+def build_index(buf):
+    """
+    (node, start, end) arrays of the runs of edge lines in buf, sorted by node and keeping the file order
+
+    >>> build_index(b'digraph {\\n1 -> 0 [a];\\n0 -> 1 [b];\\n0 -> 0 [c];\\n1 -> 1 [d];\\n}\\n')
+    (array('Q', [0, 1, 1]), array('Q', [22, 10, 46]), array('Q', [46, 22, 60]))
+    """
+    node, start, end = array.array('Q'), array.array('Q'), array.array('Q')
+    for mo in NODE_RE.finditer(buf):
+        n = int(mo.group(1))
+        if node and node[-1] == n:
+            continue
+        if node:
+            end.append(mo.start())
+        node.append(n)
+        start.append(mo.start())
+    if node:
+        # 最後の行の後は閉じ括弧だけ
+        end.append(len(buf))
+    if any(node[k] > node[k + 1] for k in range(len(node) - 1)):
+        order = sorted(range(len(node)), key=lambda k: (node[k], k))
+        node, start, end = [array.array('Q', (a[k] for k in order)) for a in (node, start, end)]
+    return node, start, end
+
+
+def _stat(fname):
+    st = os.stat(fname)
+    return st.st_size, st.st_mtime_ns
+
+
+def save_index(fname, index, size, mtime_ns):
+    node, start, end = index
+    with strix.atomic(fname) as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(node), size, mtime_ns))
+        for a in index:
+            f.write(a.tobytes())
+
+
+def load_index(fname, size, mtime_ns):
+    """
+    index saved for a DOT file of size and mtime_ns, None if there is none or it is stale
+    """
+    try:
+        with open(fname, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, n_runs, isize, imtime = HEADER.unpack_from(data)
+    if (magic, version, isize, imtime) != (MAGIC, VERSION, size, mtime_ns) or len(data) != HEADER.size + 24 * n_runs:
+        return None
+    arrays = []
+    for k in range(3):
+        a = array.array('Q')
+        a.frombytes(data[HEADER.size + 8 * n_runs * k:HEADER.size + 8 * n_runs * (k + 1)])
+        arrays.append(a)
+    return tuple(arrays)
+
+
+def index(dotfname, save=False):
+    """
+    index of dotfname, read from `<dotfname>.idx` or built (and saved there if save)
+    """
+    size, mtime_ns = _stat(dotfname)
+    idxfname = dotfname + '.idx'
+    idx = load_index(idxfname, size, mtime_ns)
+    if idx is not None:
+        return idx
+    with open(dotfname, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        idx = build_index(mm)
+    if save:
+        save_index(idxfname, idx, size, mtime_ns)
+    return idx
+
+
+class LazyTable(object):
+    """
+    Controller stepped directly on a DOT file, same step() as automaton.Table.
+    n_ins is the width of the first guard of the file unless given.
+
+    >>> import kiss, os, tempfile
+    >>> with tempfile.TemporaryDirectory() as d:
+    ...     fname = os.path.join(d, 'c.dot')
+    ...     with open(fname, 'w') as f:
+    ...         kiss.write_dot({0: [([1, -1], [1], 1), ([-1, -1], [0], 0)], 1: [([0, 0], [1], 0)]}, f)
+    ...     t = LazyTable(fname, cache_size=1)
+    ...     steps = t.step(0, 3), t.step(0, 2), t.step(1, 2), t.step(0, 2)
+    ...     t.close()
+    ...     saved = os.path.exists(fname + '.idx')
+    ...     _ = index(fname, save=True)
+    ...     t = LazyTable(fname, 2)
+    ...     steps2 = t.step(0, 3), t.step(1, 0)
+    ...     t.close()
+    >>> steps, saved, t.n_ins, t.hits, t.misses, steps2
+    (((1, (1,)), (0, (0,)), None, (0, (0,))), False, 2, 0, 2, ((1, (1,)), (0, (1,))))
+    """
+    def __init__(self, fname, n_ins=None, start=0, cache_size=CACHE_SIZE):
+        self.start = start
+        self.cache_size = cache_size
+        self.node, self.begin, self.end = index(fname)
+        with open(fname, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if n_ins is None:
+            n_ins = 0
+            if self.node:
+                l = self.mm[self.begin[0]:self.end[0]].split(b'\n', 1)[0] + b'\n'
+                n_ins = len(kiss.parse_edges(l.decode('ascii'))[1][0][0])
+        self.n_ins = n_ins
+        self.cache = collections.OrderedDict()
+        self.signals = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def n_nodes(self):
+        return self.node[-1] + 1 if self.node else 0
+
+    def edges(self, cur):
+        """
+        (care, value, node_to, outs_signal) of the edges of node cur in file order
+        """
+        edges = []
+        k = bisect.bisect_left(self.node, cur)
+        while k < len(self.node) and self.node[k] == cur:
+            for l in self.mm[self.begin[k]:self.end[k]].decode('ascii').splitlines(keepends=True):
+                parsed = kiss.parse_edges(l)
+                if parsed is None:
+                    continue
+                for ins_cond, outs_signal, node_to in parsed[1]:
+                    care, value = automaton.guard(ins_cond)
+                    sig = tuple(outs_signal)
+                    edges.append((care, value, node_to, self.signals.setdefault(sig, sig)))
+            k += 1
+        return tuple(edges)
+
+    def step(self, cur, x):
+        edges = self.cache.get(cur)
+        if edges is None:
+            self.misses += 1
+            edges = self.cache[cur] = self.edges(cur)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(cur)
+        for care, value, node_to, sig in edges:
+            if x & care == value:
+                return node_to, sig
+        return None
+
+    def close(self):
+        self.cache.clear()
+        self.mm.close()
+
+
+def main():
+    for fname in sys.argv[1:]:
+        node, _, _ = index(fname, save=True)
+        print('{0}: {1} nodes, index {2}.idx'.format(fname, len(set(node)), fname))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Hash-consed LTL formula nodes.
+
+Every node is immutable and interned, so structurally equal subformulas are
+the same object and are stored only once.
+Formulas are serialized to strix syntax only when the spec is written.
+"""
+import weakref
+
+
+class Formula(object):
+    __slots__ = ('op', 'args', '_hash', '__weakref__')
+
+    _table = weakref.WeakValueDictionary()
+
+    def __new__(cls, op, *args):
+        key = (op, args)
+        f = cls._table.get(key)
+        if f is None:
+            f = object.__new__(cls)
+            object.__setattr__(f, 'op', op)
+            object.__setattr__(f, 'args', args)
+            object.__setattr__(f, '_hash', hash(key))
+            cls._table[key] = f
+        return f
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Formula is immutable')
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (Formula, (self.op,) + self.args)
+
+    def __str__(self):
+        return dumps(self)
+
+    __repr__ = __str__
+
+
+UNARY = {'!', 'X', 'F', 'G'}
+NARY = {'&&', '||'}
+BINARY = {'->', '<->', 'R', 'U'}
+
+
+def lift(a):
+    """
+    convert variable name to Formula
+
+    >>> lift('a') is Var('a')
+    True
+    """
+    if isinstance(a, Formula):
+        return a
+    return Var(a)
+
+
+def Var(name):
+    return Formula('var', name)
+
+
+def Not(a):
+    return Formula('!', lift(a))
+
+
+def And(*args):
+    """
+    >>> And('a')
+    a
+
+    >>> And('a', 'b')
+    a && b
+    """
+    if len(args) == 1:
+        return lift(args[0])
+    return Formula('&&', *map(lift, args))
+
+
+def Or(*args):
+    if len(args) == 1:
+        return lift(args[0])
+    return Formula('||', *map(lift, args))
+
+
+def Implies(a, b):
+    return Formula('->', lift(a), lift(b))
+
+
+def Iff(a, b):
+    return Formula('<->', lift(a), lift(b))
+
+
+def X(a):
+    return Formula('X', lift(a))
+
+
+def F(a):
+    return Formula('F', lift(a))
+
+
+def G(a):
+    return Formula('G', lift(a))
+
+
+def R(a, b):
+    return Formula('R', lift(a), lift(b))
+
+
+def U(a, b):
+    return Formula('U', lift(a), lift(b))
+
+
+def dumps(f, memo=None):
+    """
+    serialize formula to strix syntax.
+    memo caches the string of each node, pass the same dict to share it between formulas.
+
+    >>> dumps(G(Implies(And('a', Not(Or('b', 'c'))), X(F('d')))))
+    'G((a && !(b || c)) -> X(F(d)))'
+
+    >>> dumps(Not(Not('a')))
+    '!!a'
+    """
+    if isinstance(f, str):
+        return f
+    if memo is None:
+        memo = {}
+    return _dumps(f, memo)
+
+
+def _dumps(f, memo):
+    s = memo.get(f)
+    if s is not None:
+        return s
+    op = f.op
+    if op == 'var':
+        s = f.args[0]
+    elif op == '!':
+        s = '!' + _atom(f.args[0], memo)
+    elif op in UNARY:
+        s = '{0}({1})'.format(op, _dumps(f.args[0], memo))
+    else:
+        s = (' ' + op + ' ').join(_atom(a, memo) for a in f.args)
+    memo[f] = s
+    return s
+
+
+def _atom(f, memo):
+    s = _dumps(f, memo)
+    if f.op in NARY or f.op in BINARY:
+        return '(' + s + ')'
+    return s
+
+
+def subterms(f):
+    """
+    iterate over distinct subformulas of f
+
+    >>> len(list(subterms(And(G('a'), F(G('a'))))))
+    4
+    """
+    seen = set()
+    stack = [f]
+    while stack:
+        g = stack.pop()
+        if g in seen:
+            continue
+        seen.add(g)
+        yield g
+        if g.op != 'var':
+            stack.extend(g.args)
+
+
+def conjuncts(f):
+    return f.args if f.op == '&&' else (f,)
+
+
+def disjuncts(f):
+    return f.args if f.op == '||' else (f,)
+
+
+def simplify(f, memo=None):
+    """
+    return an equivalent formula with no more nodes:
+    nested && and || are flattened, !! removed, repeated operands and operands
+    implied by another operand dropped, G(a) && G(b) merged into G(a && b)
+    and F(a) || F(b) into F(a || b) unless the parentheses make that longer.
+    memo caches the result of each node, pass the same dict to share it between formulas.
+
+    >>> simplify(And(G('a'), And('b', G(Not(Not('c')))), 'b'))
+    G(a && c) && b
+
+    >>> simplify(And(G(And('a', 'b')), 'a', F('b'), Or('c', 'a')))
+    G(a && b)
+
+    >>> simplify(Or(And('a', 'b'), F(F('c')), 'a', F('d')))
+    F(c || d) || a
+
+    >>> simplify(And(G(Implies('a', 'b')), G(Implies('c', 'd'))))
+    G(a -> b) && G(c -> d)
+    """
+    if memo is None:
+        memo = {}
+    return _simplify(f, memo)
+
+
+def _simplify(f, memo):
+    g = memo.get(f)
+    if g is not None:
+        return g
+    op = f.op
+    if op == 'var':
+        g = f
+    else:
+        args = [_simplify(a, memo) for a in f.args]
+        if op == '!':
+            g = args[0].args[0] if args[0].op == '!' else Not(args[0])
+        elif op in ('F', 'G'):
+            g = args[0] if args[0].op == op else Formula(op, args[0])
+        elif op == '&&':
+            g = _junction(args, '&&', 'G', memo)
+        elif op == '||':
+            g = _junction(args, '||', 'F', memo)
+        else:
+            g = Formula(op, *args)
+    memo[f] = g
+    memo[g] = g
+    return g
+
+
+def _facts(f):
+    """
+    formulas which f implies syntactically
+    """
+    facts = {f, F(f)}
+    if f.op == '&&':
+        facts.update(f.args)
+    elif f.op == 'G':
+        for k in conjuncts(f.args[0]):
+            facts.update((k, G(k), F(k), X(k)))
+    return facts
+
+
+def _junction(args, op, temporal, memo):
+    operands = []
+    for a in args:
+        for b in (a.args if a.op == op else (a,)):
+            if b not in operands:
+                operands.append(b)
+    facts = {}
+
+    def implies(a, b):
+        fa = facts.get(a)
+        if fa is None:
+            fa = facts[a] = _facts(a)
+        return b in fa or (b.op == '||' and not fa.isdisjoint(b.args))
+
+    # &&なら他から導けるもの, ||なら他を導けるものは不要
+    kept = []
+    for c in operands:
+        if op == '&&':
+            if any(implies(d, c) for d in kept):
+                continue
+            kept = [d for d in kept if not implies(c, d)]
+        else:
+            if any(implies(c, d) for d in kept):
+                continue
+            kept = [d for d in kept if not implies(d, c)]
+        kept.append(c)
+
+    temporals = [c for c in kept if c.op == temporal]
+    if len(temporals) > 1:
+        merged = _simplify(Formula(temporal, Formula(op, *[c.args[0] for c in temporals])), memo)
+        # 二項演算の中身は括弧が付くので, まとめると長くなることがある
+        if len(dumps(merged)) <= len(dumps(Formula(op, *temporals))):
+            first = next(i for i, c in enumerate(kept) if c.op == temporal)
+            kept = [c for c in kept if c.op != temporal]
+            kept.insert(first, merged)
+    if len(kept) == 1:
+        return kept[0]
+    return Formula(op, *kept)
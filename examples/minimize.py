@@ -0,0 +1,119 @@
+"""
+Minimize the synthesized Mealy machine.
+
+strix runs without --minimize because it is too slow in our loop, so its
+controller has many states which behave the same. Here the graph from
+load_dot (or kiss.load_kiss) is reduced by partition refinement.
+
+Guards with don't care are first normalized by expanding them to the dense
+table of automaton.compile_graph (first matching edge wins), so two nodes
+are compared by what they do on every input, not by how strix split their
+guards. A don't care output is kept as is, two edges only behave the same
+if their outputs are the same including the don't cares.
+
+    python minimize.py demo4_4f.dot demo4_4f_min.dot   # or out.bin (automaton.export)
+"""
+import sys
+
+import automaton
+
+
+def reachable(table):
+    """
+    nodes reachable from table.start in order of BFS
+    """
+    width = 1 << table.n_ins
+    order = [table.start]
+    seen = {table.start}
+    for node in order:
+        for node_to in table.next_node[node * width:(node + 1) * width]:
+            if node_to >= 0 and node_to not in seen:
+                seen.add(node_to)
+                order.append(node_to)
+    return order
+
+
+def partition(table, nodes):
+    """
+    return {node: block} of the coarsest partition of nodes where nodes in a block
+    give the same outputs for every input and move to the same block.
+    blocks are numbered in order of nodes.
+    """
+    width = 1 << table.n_ins
+    # 出力だけで分ける
+    block = {}
+    ids = {}
+    for node in nodes:
+        key = tuple(table.outs[node * width:(node + 1) * width])
+        block[node] = ids.setdefault(key, len(ids))
+    n_blocks = len(ids)
+    while True:
+        ids = {}
+        refined = {}
+        for node in nodes:
+            key = (block[node],) + tuple(block[node_to] if node_to >= 0 else -1
+                                         for node_to in table.next_node[node * width:(node + 1) * width])
+            refined[node] = ids.setdefault(key, len(ids))
+        block = refined
+        if len(ids) == n_blocks:
+            return block
+        n_blocks = len(ids)
+
+
+def minimize(graph, n_ins, start=0):
+    """
+    return the minimal graph equivalent to graph, the start node becomes 0.
+    edges of each block are those of its first node with targets renamed,
+    edges which never match because an earlier edge covers them are dropped.
+
+    >>> g = {0: [([1], [1], 1), ([0], [0], 2)], 1: [([1], [1], 1), ([0], [0], 2)], 2: [([-1], [1], 2), ([0], [1], 2)], 3: [([-1], [0], 3)]}
+    >>> dict(minimize(g, 1))
+    {0: [([1], [1], 0), ([0], [0], 1)], 1: [([-1], [1], 1)]}
+    """
+    table = automaton.compile_graph(graph, n_ins, start)
+    width = 1 << n_ins
+    nodes = reachable(table)
+    block = partition(table, nodes)
+    rep = {}
+    for node in nodes:
+        rep.setdefault(block[node], node)
+    reduced = {}
+    for b, node in rep.items():
+        covered = 0
+        edges = []
+        for ins_cond, outs_signal, node_to in graph.get(node, []):
+            xs = set(automaton.inputs(*automaton.guard(ins_cond), n_ins))
+            before = covered
+            for x in xs:
+                covered |= 1 << x
+            if covered != before:
+                edges.append((ins_cond, outs_signal, block[node_to]))
+            if covered == (1 << width) - 1:
+                break
+        reduced[b] = edges
+    return reduced
+
+
+def count(graph):
+    """
+    (states, edges) of graph
+    """
+    nodes = set(graph)
+    for edges in graph.values():
+        nodes.update(node_to for _, _, node_to in edges)
+    return len(nodes), sum(len(edges) for edges in graph.values())
+
+
+if __name__ == '__main__':
+    import kiss
+    from demo4_play import load_dot
+    src, dest = sys.argv[1], sys.argv[2]
+    graph = kiss.load_kiss(src) if src.endswith('.kiss') else load_dot(src)
+    N = kiss.n_inputs(graph)
+    reduced = minimize(graph, N)
+    print('states {0} -> {2}, edges {1} -> {3}'.format(*count(graph), *count(reduced)))
+    if dest.endswith('.dot'):
+        with open(dest, 'w') as fout:
+            kiss.write_dot(reduced, fout)
+    else:
+        automaton.export(reduced, N, dest)
@@ -0,0 +1,58 @@
+"""
+QuickXplain: find a minimal conflicting subset.
+
+consistent(items) must be monotone: if a set is inconsistent, every superset is inconsistent too.
+For LTL synthesis "consistent" is "realizable", adding guarantees never makes a spec realizable again.
+"""
+
+
+def quickxplain(base, targets, consistent, inconsistent=False):
+    """
+    return a minimal list of targets that is inconsistent together with base,
+    or None if base + targets is consistent.
+    It needs O(k log(n/k)) calls of consistent for a conflict of size k among n targets.
+    If inconsistent is True, base + targets is known to be inconsistent and is not checked.
+
+    >>> quickxplain([], [1, 2, 3, 4, 5, 6], lambda s: not (2 in s and 5 in s))
+    [2, 5]
+
+    >>> quickxplain([5], [1, 2, 3, 4, 6], lambda s: not (2 in s and 5 in s))
+    [2]
+
+    >>> quickxplain([], [1, 2, 3], lambda s: 4 not in s) is None
+    True
+
+    >>> quickxplain([4], [1, 2, 3], lambda s: 4 not in s)
+    []
+
+    >>> calls = []
+    >>> quickxplain([], [1, 2, 3, 4], lambda s: calls.append(len(s)) or 2 not in s, inconsistent=True), calls
+    ([2], [0, 2, 1, 1])
+    """
+    memo = {}
+
+    def check(items):
+        key = frozenset(map(id, items))
+        if key not in memo:
+            memo[key] = consistent(items)
+        return memo[key]
+
+    if inconsistent:
+        memo[frozenset(map(id, base + targets))] = False
+    elif check(base + targets):
+        return None
+    if not targets or not check(base):
+        return []
+    return _qx(base, [], targets, check)
+
+
+def _qx(base, delta, targets, check):
+    if delta and not check(base):
+        return []
+    if len(targets) == 1:
+        return targets
+    k = len(targets) // 2
+    t1, t2 = targets[:k], targets[k:]
+    d2 = _qx(base + t1, t1, t2, check)
+    d1 = _qx(base + d2, d2, t1, check)
+    return d1 + d2
@@ -0,0 +1,139 @@
+"""
+Render controller DOT files to SVG in a background thread.
+
+The hash of the DOT file is written as a comment into the SVG, a file whose
+SVG already has the same hash is not rendered again. Graphs with more than
+max_edges edges are rendered as a summary where states are collapsed into
+groups with the same set of outputs (only the first n_outs of them, e.g. the
+lift position and door without the go flags).
+
+    renderer = Renderer(max_edges=2000)
+    renderer.submit('demo4_4f.dot', 'demo4_4f.svg')
+    ...
+    renderer.wait()
+"""
+import collections
+import concurrent.futures
+import hashlib
+import io
+import re
+import subprocess
+
+import demo4_play
+import instrument
+import strix
+
+MARK = '<!-- dot-sha256: {0} -->\n'
+MARK_RE = re.compile(r'<!-- dot-sha256: (\w+) -->')
+
+
+def rendered(svgfname):
+    """
+    hash written in svgfname, None if there is none
+    """
+    try:
+        with open(svgfname) as f:
+            for _, l in zip(range(4), f):
+                mo = MARK_RE.match(l)
+                if mo is not None:
+                    return mo.group(1)
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def summarize(graph, n_outs=None):
+    """
+    DOT of graph with nodes collapsed by the set of output signals (first n_outs outputs) of their edges,
+    edges between groups are labeled by how many edges they stand for.
+
+    >>> print(summarize({0: [([1], [1], 1), ([0], [0], 0)], 1: [([-1], [1], 2)], 2: [([-1], [1], 1)]}), end='')
+    digraph "summary" {
+      node [shape=box];
+      init [shape=point];
+      init -> 0;
+      0 [label="1 states\\l0\\l1\\l"];
+      1 [label="2 states\\l1\\l"];
+      0 -> 0 [label="1"];
+      0 -> 1 [label="1"];
+      1 -> 1 [label="2"];
+    }
+    """
+    nodes = set(graph)
+    for edges in graph.values():
+        nodes.update(node_to for _, _, node_to in edges)
+    outs = {}
+    for n in nodes:
+        outs[n] = tuple(sorted({''.join('-' if v == -1 else str(v) for v in o[:n_outs]) for _, o, _ in graph.get(n, [])}))
+    groups = {}
+    for n in sorted(nodes):
+        groups.setdefault(outs[n], len(groups))
+    size = collections.Counter(groups[outs[n]] for n in nodes)
+    counts = collections.Counter()
+    for n, edges in graph.items():
+        for _, _, node_to in edges:
+            counts[groups[outs[n]], groups[outs[node_to]]] += 1
+    f = io.StringIO()
+    f.write('digraph "summary" {\n  node [shape=box];\n  init [shape=point];\n  init -> 0;\n')
+    for key, g in groups.items():
+        f.write('  {0} [label="{1} states\\l{2}"];\n'.format(g, size[g], ''.join('{0}\\l'.format(s) for s in key)))
+    for (a, b), c in sorted(counts.items()):
+        f.write('  {0} -> {1} [label="{2}"];\n'.format(a, b, c))
+    f.write('}\n')
+    return f.getvalue()
+
+
+class Renderer(object):
+    """
+    Run `dot -Tsvg` in one background thread.
+    If max_edges is set, larger graphs are rendered by summarize() grouping by the first summary_outs outputs.
+    """
+    def __init__(self, max_edges=None, summary_outs=None):
+        self.max_edges = max_edges
+        self.summary_outs = summary_outs
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    def submit(self, dotfname, svgfname):
+        """
+        render dotfname to svgfname later, the future returns 'cached', 'full', 'summary' or 'failed'
+        """
+        return self.executor.submit(self.render, dotfname, svgfname)
+
+    def render(self, dotfname, svgfname):
+        with instrument.span('render', svg=svgfname) as attrs:
+            attrs['mode'] = self._render(dotfname, svgfname)
+            return attrs['mode']
+
+    def _render(self, dotfname, svgfname):
+        with open(dotfname, 'rb') as f:
+            data = f.read()
+        graph = None
+        mode = 'full'
+        if self.max_edges is not None:
+            graph = demo4_play.load_dot(dotfname)
+            if sum(len(edges) for edges in graph.values()) > self.max_edges:
+                mode = 'summary'
+        key = hashlib.sha256(data + '\0{0}\0{1}'.format(mode, self.summary_outs).encode('utf-8')).hexdigest()
+        if rendered(svgfname) == key:
+            return 'cached'
+        if mode == 'summary':
+            data = summarize(graph, self.summary_outs).encode('utf-8')
+        try:
+            p = subprocess.run(['dot', '-Tsvg'], input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            print('dot not found, {0} is not rendered'.format(svgfname))
+            return 'failed'
+        if p.returncode != 0:
+            print('dot failed for {0}: {1}'.format(dotfname, p.stderr.decode('utf-8', 'replace').strip()))
+            return 'failed'
+        svg = p.stdout.decode('utf-8')
+        # XML宣言の後にhashを書く
+        head, sep, rest = svg.partition('\n')
+        if not head.startswith('<?xml'):
+            head, sep, rest = '', '', svg
+        with strix.atomic(svgfname) as f:
+            f.write((head + sep + MARK.format(key) + rest).encode('utf-8'))
+        return mode
+
+    def wait(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,176 @@
+"""
+Worst case response time of a synthesized controller.
+
+Unlike service_bench.py nothing is sampled: the input is chosen adversarially
+among the inputs the controller accepts (the assumptions of demo4.py), and
+sets of nodes are python ints used as bitsets.
+
+For each floor i the response time is the number of steps from a step where
+req_i rises (req_i was 0 at the previous step) until the first step whose
+output grants floor i (lift j is at floor i with door j open, grant(i) in
+demo4.py), 0 if it is granted at the same step.
+
+    python response.py demo4_4f.dot --max-steps 20
+"""
+import argparse
+import json
+import sys
+
+import demo4_play
+
+
+def bits(s):
+    """
+    iterate the members of bitset s
+
+    >>> list(bits(0b10110))
+    [1, 2, 4]
+    """
+    while s:
+        low = s & -s
+        yield low.bit_length() - 1
+        s ^= low
+
+
+def granted(sig, i, N, M=1):
+    """
+    True if output signal sig grants floor i, don't care is not granted
+    """
+    opn = N * M + 3 * M
+    return any(sig[j * N + i] == 1 and sig[opn + j] == 1 for j in range(M))
+
+
+class Analysis(object):
+    """
+    reachable, dead and unreachable nodes and the worst case response time per floor of table.
+    table should have the nodes as written by strix (demo4_play.load_table does not minimize),
+    minimizing drops the unreachable nodes.
+
+    one floor: outputs lft0_0, stop0, up0, down0, open_0, go_0
+    >>> import automaton
+    >>> NG, GR = [0, 1, 0, 0, 0, 0], [1, 1, 0, 0, 1, 0]
+    >>> t = automaton.compile_graph({0: [([-1], NG, 1)], 1: [([-1], GR, 0)], 2: [([-1], GR, 0)]}, 1)
+    >>> Analysis(t).report()
+    {'nodes': 3, 'reachable': 2, 'dead': [], 'unreachable': [2], 'response': [1]}
+    >>> Analysis(t).steps_to_grant(0)
+    [1, 0, None]
+
+    never granted, and node 1 has no edge
+    >>> t = automaton.compile_graph({0: [([1], NG, 0), ([0], NG, 1)]}, 1)
+    >>> Analysis(t).report()
+    {'nodes': 2, 'reachable': 2, 'dead': [1], 'unreachable': [], 'response': [None]}
+    """
+    def __init__(self, table, N=None, M=1):
+        self.table = table
+        self.N = table.n_ins if N is None else N
+        self.M = M
+        width = 1 << table.n_ins
+        # 遷移を全部展開する. (node_from, x, node_to, outs)
+        self.edges = [[] for _ in range(table.n_nodes)]
+        self.succ = [0] * table.n_nodes
+        for node in range(table.n_nodes):
+            for x in range(width):
+                step = table.step(node, x)
+                if step is not None:
+                    self.edges[node].append((x, step[0], step[1]))
+                    self.succ[node] |= 1 << step[0]
+        self.reachable = self.reach(1 << table.start)
+        self.dead = sum(1 << n for n in bits(self.reachable) if not self.edges[n])
+        self.unreachable = ((1 << table.n_nodes) - 1) & ~self.reachable
+
+    def reach(self, s):
+        """
+        bitset of nodes reachable from bitset s
+        """
+        seen = s
+        frontier = s
+        while frontier:
+            nxt = 0
+            for n in bits(frontier):
+                nxt |= self.succ[n]
+            frontier = nxt & ~seen
+            seen |= frontier
+        return seen
+
+    def steps_to_grant(self, i):
+        """
+        list of worst case steps from each node until floor i is granted (None if never guaranteed).
+        node is in layer k if every input either grants at once or moves to layer k - 1 or below.
+        """
+        ng_succ = [0] * len(self.edges)
+        for n in bits(self.reachable):
+            for x, node_to, sig in self.edges[n]:
+                if not granted(sig, i, self.N, self.M):
+                    ng_succ[n] |= 1 << node_to
+        dist = [None] * len(self.edges)
+        done = 0
+        todo = self.reachable
+        k = 0
+        while todo:
+            layer = 0
+            for n in bits(todo):
+                if ng_succ[n] & ~done == 0:
+                    layer |= 1 << n
+            if not layer:
+                break
+            for n in bits(layer):
+                dist[n] = k
+            done |= layer
+            todo &= ~layer
+            k += 1
+        return dist
+
+    def response(self, i):
+        """
+        worst case response time of floor i, None if unbounded (never if no req_i rises)
+        """
+        dist = self.steps_to_grant(i)
+        # req_iが0で入ってくるnode
+        low = 1 << self.table.start
+        for n in bits(self.reachable):
+            for x, node_to, sig in self.edges[n]:
+                if not (x >> i) & 1:
+                    low |= 1 << node_to
+        worst = 0
+        for n in bits(low & self.reachable):
+            for x, node_to, sig in self.edges[n]:
+                if not (x >> i) & 1 or granted(sig, i, self.N, self.M):
+                    continue
+                if dist[node_to] is None:
+                    return None
+                worst = max(worst, 1 + dist[node_to])
+        return worst
+
+    def report(self):
+        count = lambda s: bin(s).count('1')
+        return {
+            'nodes': self.table.n_nodes,
+            'reachable': count(self.reachable),
+            'dead': sorted(bits(self.dead)),
+            'unreachable': sorted(bits(self.unreachable)),
+            'response': [self.response(i) for i in range(self.N)],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('automaton', nargs='?', default='demo4_4f.dot')
+    parser.add_argument('--lifts', type=int, default=1)
+    parser.add_argument('--max-steps', type=int, help='exit 1 if some floor may wait longer')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    table = demo4_play.load_table(args.automaton)
+    r = Analysis(table, M=args.lifts).report()
+    if args.json:
+        print(json.dumps(r))
+    else:
+        print('nodes={nodes} reachable={reachable} dead={dead} unreachable={unreachable}'.format(**r))
+        for i, w in enumerate(r['response']):
+            print('  floor {0}: {1}'.format(i, 'unbounded' if w is None else '{0} steps'.format(w)))
+    if args.max_steps is not None and any(w is None or w > args.max_steps for w in r['response']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
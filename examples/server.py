@@ -0,0 +1,113 @@
+"""
+Serve one loaded controller to many sessions over a local socket.
+
+The automaton is loaded once, a session is only its current node. Each
+connection can run any number of sessions, one request per line:
+
+    <session> <req bits>     ->  <session> <output signals>   e.g. `7 0100` -> `7 100010000100`
+    <session> reset          ->  <session> ok
+    <session> close          ->  <session> ok
+
+req bits are given as in demo4_play.py (req_0 first), outputs in the order of
+demo4.py outs with '-' for don't care. An input which breaks the assumption
+gets `<session> invalid` and the session stays where it was.
+
+    python server.py demo4_4f.dot --unix /tmp/elevator.sock
+    python server.py demo4_4f.dot --tcp 127.0.0.1:8765
+"""
+import argparse
+import asyncio
+
+import automaton
+import demo4_play
+
+HIGH_WATER = 64 * 1024
+
+
+class Server(object):
+    def __init__(self, table):
+        self.table = table
+        self.n_ins = table.n_ins
+        # 出力は種類が少ないので文字列を使い回す
+        self.signals = {}
+
+    def signal(self, sig):
+        s = self.signals.get(sig)
+        if s is None:
+            s = self.signals[sig] = ''.join('-' if v == -1 else str(v) for v in sig)
+        return s
+
+    def request(self, sessions, line):
+        """
+        handle one request line, sessions maps session id to current node
+        """
+        words = line.split()
+        if len(words) != 2:
+            return 'error bad request'
+        sid, arg = words
+        if arg == 'reset':
+            sessions[sid] = self.table.start
+            return sid + ' ok'
+        if arg == 'close':
+            sessions.pop(sid, None)
+            return sid + ' ok'
+        if len(arg) != self.n_ins or arg.strip('01'):
+            return sid + ' error bad input'
+        cur = sessions.get(sid)
+        if cur is None:
+            cur = sessions[sid] = self.table.start
+        step = self.table.step(cur, automaton.pack(convert(arg)))
+        if step is None:
+            return sid + ' invalid'
+        sessions[sid] = step[0]
+        return sid + ' ' + self.signal(step[1])
+
+    async def handle(self, reader, writer):
+        sessions = {}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write((self.request(sessions, line.decode('ascii', 'replace')) + '\n').encode('ascii'))
+                if writer.transport.get_write_buffer_size() > HIGH_WATER:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def convert(bits):
+    return [1 if c == '1' else 0 for c in bits]
+
+
+async def serve(table, tcp=None, unix=None):
+    server = Server(table)
+    if unix is not None:
+        s = await asyncio.start_unix_server(server.handle, unix)
+    else:
+        host, _, port = tcp.rpartition(':')
+        s = await asyncio.start_server(server.handle, host or '127.0.0.1', int(port))
+    async with s:
+        print('serving', unix or tcp, flush=True)
+        await s.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('automaton', nargs='?', default='demo4_4f.dot')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--tcp', default='127.0.0.1:8765', help='host:port')
+    group.add_argument('--unix', help='path of unix socket')
+    parser.add_argument('--lazy', action='store_true', help='decode the nodes of a large DOT file when a session first visits them')
+    args = parser.parse_args()
+    table = demo4_play.load_table(args.automaton, args.lazy)
+    try:
+        asyncio.run(serve(table, args.tcp, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Service quality of a synthesized controller.
+
+Generates passenger traffic over the req inputs, drives the controller and
+reports per floor how many steps a request waits until the lift is at that
+floor with the door open (grant(i) in demo4.py), plus travel distance and
+door cycles.
+
+    python service_bench.py demo4_4f.dot --traces 2000 --steps 300 --rate 0.05
+"""
+import argparse
+import json
+
+import numpy as np
+
+import demo4_play
+import simulate
+
+
+def weights(pattern, N):
+    """
+    relative request rate of each floor
+
+    uniform : every floor the same
+    up      : morning up-peak, most calls from the lobby (floor 0), the rest go up to every floor
+    down    : evening down-peak, most calls from the upper floors, a few from the lobby
+    """
+    if pattern == 'uniform':
+        w = np.ones(N)
+    elif pattern == 'up':
+        w = np.ones(N)
+        w[0] = 3 * (N - 1)
+    elif pattern == 'down':
+        w = np.full(N, 3.0)
+        w[0] = 1
+    else:
+        raise ValueError('unknown traffic pattern: {0}'.format(pattern))
+    return w / w.sum()
+
+
+def traffic(pattern, N, n_traces, n_steps, rate, rng):
+    """
+    (traces, steps, N) 0/1 array of req_i, on average rate requests per step.
+    nothing is requested at step 0 (assumption of demo4.py).
+    """
+    p = np.minimum(rate * weights(pattern, N), 1.0)
+    ins = (rng.random((n_traces, n_steps, N)) < p).astype(np.int8)
+    ins[:, 0] = 0
+    return ins
+
+
+def granted(res, N, M=1):
+    """
+    (traces, steps, N) bool, lift j is at floor i and door j is open for some j
+    """
+    lft = res['lft'] == 1
+    opn = res['open'] == 1
+    g = np.zeros(lft.shape[:2] + (N,), dtype=bool)
+    for j in range(M):
+        g |= lft[..., j * N:(j + 1) * N] & opn[..., j:j + 1]
+    return g
+
+
+def waits(req, grant):
+    """
+    steps from each request to the first grant at or after it, -1 if never granted.
+    req and grant are (traces, steps) bool.
+
+    >>> waits(np.array([[0, 1, 1, 0, 1, 0]], bool), np.array([[0, 0, 0, 1, 0, 0]], bool))
+    array([ 2,  1, -1])
+    """
+    n_traces, n_steps = grant.shape
+    next_grant = np.full(grant.shape, -1, dtype=np.int64)
+    nxt = np.full(n_traces, -1, dtype=np.int64)
+    for s in range(n_steps - 1, -1, -1):
+        nxt = np.where(grant[:, s], s, nxt)
+        next_grant[:, s] = nxt
+    t, s = np.nonzero(req)
+    ng = next_grant[t, s]
+    return np.where(ng >= 0, ng - s, -1)
+
+
+def travel(res, N, M=1):
+    """
+    number of floor changes of every lift, summed over lifts, per trace
+    """
+    lft = res['lft']
+    total = np.zeros(lft.shape[0], dtype=np.int64)
+    for j in range(M):
+        floor = np.argmax(lft[..., j * N:(j + 1) * N] == 1, axis=-1)
+        total += (floor[:, 1:] != floor[:, :-1]).sum(axis=1)
+    return total
+
+
+def door_cycles(res):
+    """
+    number of door openings per trace
+    """
+    opn = res['open'] == 1
+    return (opn[:, 1:] & ~opn[:, :-1]).sum(axis=(1, 2)) + opn[:, 0].sum(axis=1)
+
+
+def bench(table, pattern, n_traces, n_steps, rate, seed=0, M=1):
+    N = table.n_ins
+    rng = np.random.default_rng(seed)
+    ins = traffic(pattern, N, n_traces, n_steps, rate, rng)
+    res = simulate.simulate(table, ins, N, M)
+    valid = res['valid'][:, -1]
+    grant = granted(res, N, M)
+    floors = []
+    for i in range(N):
+        w = waits(ins[valid, :, i] == 1, grant[valid, :, i])
+        served = w[w >= 0]
+        floors.append({
+            'floor': i,
+            'requests': int(len(w)),
+            'unserved': int((w < 0).sum()),
+            'p50': float(np.percentile(served, 50)) if len(served) else None,
+            'p95': float(np.percentile(served, 95)) if len(served) else None,
+            'max': int(served.max()) if len(served) else None,
+        })
+    return {
+        'pattern': pattern,
+        'traces': int(n_traces),
+        'steps': int(n_steps),
+        'rate': rate,
+        'invalid_traces': int((~valid).sum()),
+        'floors': floors,
+        'travel_per_trace': float(travel(res, N, M)[valid].mean()),
+        'door_cycles_per_trace': float(door_cycles(res)[valid].mean()),
+    }
+
+
+def report(r):
+    print('{pattern}: {traces} traces x {steps} steps, rate={rate}, invalid={invalid_traces}'.format(**r))
+    print('  floor  requests  unserved    p50    p95    max')
+    for f in r['floors']:
+        print('  {floor:5d}  {requests:8d}  {unserved:8d}  {0:>5}  {1:>5}  {2:>5}'.format(
+            *('-' if f[k] is None else '{0:.1f}'.format(f[k]) for k in ('p50', 'p95')),
+            '-' if f['max'] is None else f['max'], **f))
+    print('  travel/trace={travel_per_trace:.1f} door cycles/trace={door_cycles_per_trace:.1f}'.format(**r))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('automaton', nargs='?', default='demo4_4f.dot')
+    parser.add_argument('--lifts', type=int, default=1)
+    parser.add_argument('--patterns', default='uniform,up,down')
+    parser.add_argument('--traces', type=int, default=1000)
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=0.1, help='requests per step')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    table = demo4_play.load_table(args.automaton)
+    results = []
+    for pattern in args.patterns.split(','):
+        r = bench(table, pattern, args.traces, args.steps, args.rate, args.seed, args.lifts)
+        report(r)
+        results.append(r)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Batch simulation of the synthesized controller with numpy.
+
+All traces advance together, each step is one gather over the transition table.
+
+    table = demo4_play.load_table('demo4_4f.dot')
+    ins = np.random.randint(0, 2, size=(100000, 50, 4))  # traces x steps x req_*
+    ins[:, 0] = 0
+    res = simulate(table, ins, N=4)
+    res['lft'].shape  # (100000, 50, 4)
+"""
+import numpy as np
+
+
+class Batch(object):
+    """
+    Transition table of automaton.Table or automaton.MappedTable as numpy arrays.
+
+    next_node[node, x] is the node after input x (-1 if x breaks the assumption),
+    signal_id[node, x] indexes signals, the output signals (-1 is don't care).
+    """
+    def __init__(self, table):
+        self.n_ins = table.n_ins
+        self.start = table.start
+        width = 1 << table.n_ins
+        self.next_node = np.full((table.n_nodes, width), -1, dtype=np.int32)
+        self.signal_id = np.zeros((table.n_nodes, width), dtype=np.int32)
+        ids = {}
+        for node in range(table.n_nodes):
+            for x in range(width):
+                step = table.step(node, x)
+                if step is None:
+                    continue
+                node_to, sig = step
+                self.next_node[node, x] = node_to
+                self.signal_id[node, x] = ids.setdefault(sig, len(ids))
+        n_outs = max((len(sig) for sig in ids), default=0)
+        self.signals = np.full((max(len(ids), 1), n_outs), -1, dtype=np.int8)
+        for sig, i in ids.items():
+            self.signals[i, :len(sig)] = sig
+
+    def pack(self, ins):
+        """
+        (traces, steps, n_ins) array of 0/1 to (traces, steps) input bit vectors, bit i is input i
+        """
+        weights = 1 << np.arange(self.n_ins, dtype=np.int64)
+        return (np.asarray(ins, dtype=np.int64) * weights).sum(axis=-1)
+
+    def run(self, ins):
+        """
+        return (signal ids, valid), both (traces, steps).
+        a trace which breaks the assumption stays invalid and stops moving from that step.
+        """
+        xs = self.pack(ins)
+        n_traces, n_steps = xs.shape
+        cur = np.full(n_traces, self.start, dtype=np.int32)
+        alive = np.ones(n_traces, dtype=bool)
+        sig = np.zeros((n_traces, n_steps), dtype=np.int32)
+        valid = np.zeros((n_traces, n_steps), dtype=bool)
+        for s in range(n_steps):
+            x = xs[:, s]
+            nxt = self.next_node[cur, x]
+            alive &= nxt >= 0
+            valid[:, s] = alive
+            sig[:, s] = self.signal_id[cur, x]
+            cur = np.where(alive, nxt, cur)
+        return sig, valid
+
+    def outputs(self, sig):
+        """
+        signal ids to (…, n_outs) output array
+        """
+        return self.signals[sig]
+
+
+def streams(outputs, N, M=1):
+    """
+    split outputs by the order of outs in demo4.py: lft, move (stop, up, down), open, go
+    """
+    i = 0
+    res = {}
+    for name, width in (('lft', N * M), ('move', 3 * M), ('open', M), ('go', N)):
+        res[name] = outputs[..., i:i + width]
+        i += width
+    return res
+
+
+def simulate(table, ins, N, M=1):
+    """
+    run all traces of ins (traces x steps x req_*) and return the lft, move, open and go
+    output streams as arrays, plus 'valid' which is False from the step a trace broke the assumption.
+    """
+    batch = Batch(table)
+    sig, valid = batch.run(ins)
+    res = streams(batch.outputs(sig), N, M)
+    res['valid'] = valid
+    return res
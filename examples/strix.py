@@ -0,0 +1,497 @@
+"""
+Run strix and cache its results.
+
+The spec is streamed to strix stdin and the automaton strix prints after the
+verdict is copied to a file in chunks, so neither is held in memory.
+"""
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import itertools
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+STRIX = '/strix/bin/strix'
+FLAGS = ['--kiss']  # '--minimize'
+
+CACHE_DIR = os.environ.get('STRIX_CACHE', os.path.expanduser('~/.cache/elevator-ltl-strx'))
+CACHE_SIZE = int(os.environ.get('STRIX_CACHE_SIZE', 256 * 1024 * 1024))
+
+VERDICTS = ('REALIZABLE', 'UNREALIZABLE')
+
+CHUNK = 64 * 1024
+
+
+def command(fname, ins, outs, flags=FLAGS):
+    return [STRIX] + list(flags) + [
+        fname,
+        '--ins=' + ','.join(ins),
+        '--outs=' + ','.join(outs),
+    ]
+
+
+def write_spec(fout, spec):
+    """
+    spec is the spec text or a function writing it to fout
+    """
+    if callable(spec):
+        spec(fout)
+    else:
+        fout.write(spec)
+
+
+@contextlib.contextmanager
+def atomic(fname):
+    """
+    open binary file which replaces fname when the with block ends without error
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(fname)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        os.replace(tmp, fname)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class _KeyWriter(object):
+    """
+    text file hashing what is written with whitespace normalized,
+    same as hashing ' '.join(text.split()) without keeping the text.
+    """
+    def __init__(self, h):
+        self.h = h
+        self.empty = True
+        self.sep = False
+
+    def write(self, s):
+        for i, w in enumerate(s.split()):
+            if (i > 0 or self.sep or s[0].isspace()) and not self.empty:
+                self.h.update(b' ')
+            self.h.update(w.encode('utf-8'))
+            self.empty = False
+            self.sep = False
+        if s and s[-1].isspace():
+            self.sep = True
+
+
+class Cache(object):
+    """
+    Content addressed cache of strix results.
+
+    Each entry is a file named by the hash of the spec and strix arguments.
+    The first line is the verdict and the rest is the strix output.
+    Runs which only needed the verdict are stored as `<key>.verdict` without the output.
+    Least recently used entries are removed when the total size exceeds max_bytes.
+    """
+    def __init__(self, path=CACHE_DIR, max_bytes=CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(spec, ins, outs, flags=FLAGS):
+        """
+        >>> Cache.key('a ->\\n b', ['a'], ['b']) == Cache.key('a -> b', ['a'], ['b'])
+        True
+
+        >>> Cache.key('a -> b', ['a'], ['b']) == Cache.key(lambda f: f.write('a ') or f.write(' -> b'), ['a'], ['b'])
+        True
+
+        >>> Cache.key('a -> b', ['a'], ['b']) == Cache.key('a -> b', ['a'], ['b'], ['--dot'])
+        False
+        """
+        h = hashlib.sha256()
+        write_spec(_KeyWriter(h), spec)
+        for part in (','.join(ins), ','.join(outs), ' '.join(flags)):
+            h.update(b'\0')
+            h.update(part.encode('utf-8'))
+        return h.hexdigest()
+
+    def _fname(self, key, output=True):
+        if output:
+            return os.path.join(self.path, key)
+        return os.path.join(self.path, key + '.verdict')
+
+    def get(self, key, output=False):
+        """
+        return cached verdict or None.
+        if output is True, realizable entries without the strix output are ignored.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     cache = Cache(d)
+        ...     with cache.entry('r', 'REALIZABLE', output=False), cache.entry('u', 'UNREALIZABLE', output=False):
+        ...         pass
+        ...     cache.get('r'), cache.get('r', output=True), cache.get('u', output=True), cache.get('x')
+        ('REALIZABLE', None, 'UNREALIZABLE', None)
+        """
+        for full in (True, False):
+            fname = self._fname(key, full)
+            try:
+                with open(fname, 'rb') as f:
+                    verdict = f.readline().decode('utf-8').rstrip('\n')
+            except FileNotFoundError:
+                continue
+            if output and not full and verdict == 'REALIZABLE':
+                return None
+            os.utime(fname)
+            return verdict
+        return None
+
+    def copy(self, key, fout):
+        """
+        copy cached strix output to binary file fout
+        """
+        with open(self._fname(key), 'rb') as f:
+            f.readline()
+            while True:
+                chunk = f.read(CHUNK)
+                if not chunk:
+                    break
+                fout.write(chunk)
+
+    @contextlib.contextmanager
+    def entry(self, key, verdict, output=True):
+        """
+        create an entry, strix output is written to the yielded binary file.
+        the entry appears when the with block ends without error.
+        """
+        with atomic(self._fname(key, output)) as f:
+            f.write(verdict.encode('utf-8') + b'\n')
+            yield f
+        self.evict()
+
+    def evict(self):
+        """
+        remove least recently used entries until the total size is at most max_bytes
+
+        >>> import tempfile, time
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     cache = Cache(d, max_bytes=40)
+        ...     for key in ('a', 'b', 'c'):
+        ...         with cache.entry(key, 'REALIZABLE') as f:
+        ...             _ = f.write(b'automaton')
+        ...         time.sleep(0.05)  # mtime is updated once per clock tick
+        ...         _ = cache.get('a')
+        ...         time.sleep(0.05)
+        ...     sorted(os.listdir(d)), sum(e.stat().st_size for e in os.scandir(d))
+        (['a', 'c'], 40)
+        """
+        entries = []
+        total = 0
+        for e in os.scandir(self.path):
+            if e.name.endswith('.tmp'):
+                continue
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _limit(cmd, max_memory):
+    """
+    cmd run with at most max_memory bytes of address space.
+    prlimit (util-linux) sets the limit and execs, so no python runs in the child
+    (preexec_fn may deadlock when Pool threads are running).
+
+    >>> _limit(['strix', 'a'], 2 ** 30)
+    ['prlimit', '--as=1073741824', 'strix', 'a']
+    """
+    if max_memory is None:
+        return cmd
+    return ['prlimit', '--as={0}'.format(max_memory)] + cmd
+
+
+def _env(max_memory):
+    """
+    environment of strix limited to max_memory bytes, None to inherit ours.
+
+    strix is a JVM which reserves its max heap (default 1/4 of RAM) as address space
+    when it starts, so the heap is capped at half of max_memory with STRIX_OPTS
+    (read by the strix start script). The other half is for the JVM itself
+    (code cache, class space, threads), max_memory should be at least a few GB.
+
+    >>> _env(2 ** 32)['STRIX_OPTS'].split()[-1]
+    '-Xmx2147483648'
+    """
+    if max_memory is None:
+        return None
+    env = dict(os.environ)
+    env['STRIX_OPTS'] = '{0} -Xmx{1}'.format(env.get('STRIX_OPTS', ''), max_memory // 2).strip()
+    return env
+
+
+def _kill(p):
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def wait(p):
+    """
+    wait for subprocess p, return its exit code and keep its own resource usage in p.rusage
+    """
+    if p.returncode is None:
+        _, status, p.rusage = os.wait4(p.pid, 0)
+        # os.waitstatus_to_exitcode は 3.9 から
+        p.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return p.returncode
+
+
+class _Aborted(Exception):
+    pass
+
+
+def run(spec, ins, outs, dest=None, flags=FLAGS, cache=None, timeout=None, max_memory=None, started=None, stats=None):
+    """
+    run strix and return its verdict.
+
+    spec is the spec text or a function writing it to a text file, it is streamed to strix stdin.
+    If the spec is realizable the automaton is copied to the file dest in chunks.
+    Without dest strix is stopped as soon as the verdict is read.
+    strix runs in its own process group, killed after timeout seconds ('TIMEOUT' is returned)
+    and limited to max_memory bytes of address space (see _env).
+    If stats is a dict, wall time, user/sys cpu time and peak RSS (bytes) of strix are stored in it.
+
+    >>> import strix, tempfile
+    >>> d = tempfile.TemporaryDirectory()
+    >>> strix.STRIX, real = os.path.join(d.name, 'strix'), strix.STRIX
+    >>> with open(strix.STRIX, 'w') as f:
+    ...     _ = f.write('#!/bin/sh\\nspec=$(cat)\\necho REALIZABLE\\ncase "$spec" in *slow*) echo 1; sleep 10;; esac\\necho "$spec"\\n')
+    >>> os.chmod(strix.STRIX, 0o755)
+    >>> out = os.path.join(d.name, 'out')
+    >>> cache = Cache(os.path.join(d.name, 'cache'))
+    >>> stats = {}
+
+    without dest only the verdict is cached, it does not give the automaton
+
+    >>> run('a -> b', ['a'], ['b'], cache=cache, stats=stats), stats['cached']
+    ('REALIZABLE', False)
+    >>> run('a -> b', ['a'], ['b'], out, cache=cache, stats=stats), stats['cached']
+    ('REALIZABLE', False)
+    >>> run('a -> b', ['a'], ['b'], out + '2', cache=cache, stats=stats), stats['cached']
+    ('REALIZABLE', True)
+    >>> with open(out) as f1, open(out + '2') as f2:
+    ...     f1.read(), f2.read()
+    ('a -> b\\n', 'a -> b\\n')
+
+    killed in the middle of the automaton, dest is left as it was and nothing is cached
+
+    >>> run('slow', ['a'], ['b'], out, cache=cache, timeout=0.5)
+    'TIMEOUT'
+    >>> with open(out) as f:
+    ...     f.read()
+    'a -> b\\n'
+    >>> cache.get(cache.key('slow', ['a'], ['b'])), sorted(os.listdir(d.name)), len(os.listdir(cache.path))
+    (None, ['cache', 'out', 'out2', 'strix'], 2)
+    >>> strix.STRIX = real
+    >>> d.cleanup()
+    """
+    key = None
+    if stats is not None:
+        stats['cached'] = False
+    if cache is not None:
+        key = cache.key(spec, ins, outs, flags)
+        verdict = cache.get(key, output=dest is not None)
+        if verdict is not None:
+            if stats is not None:
+                stats['cached'] = True
+            if dest is not None and verdict == 'REALIZABLE':
+                with atomic(dest) as fout:
+                    cache.copy(key, fout)
+            return verdict
+
+    t0 = time.monotonic()
+    p = subprocess.Popen(
+        _limit(command('/dev/stdin', ins, outs, flags), max_memory),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=_env(max_memory),
+        start_new_session=True)
+    if started is not None:
+        started(p)
+    expired = threading.Event()
+    timer = None
+    if timeout is not None:
+        def expire():
+            expired.set()
+            _kill(p)
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+    try:
+        try:
+            with io.TextIOWrapper(p.stdin, encoding='utf-8') as fin:
+                write_spec(fin, spec)
+        except BrokenPipeError:
+            pass
+        verdict = p.stdout.readline().decode('utf-8').rstrip('\n')
+        if verdict not in VERDICTS:
+            return 'TIMEOUT' if expired.is_set() else verdict
+        if verdict == 'UNREALIZABLE' or dest is None:
+            if cache is not None:
+                with cache.entry(key, verdict, output=False):
+                    pass
+            return verdict
+        with contextlib.ExitStack() as stack:
+            targets = [stack.enter_context(atomic(dest))]
+            if cache is not None:
+                targets.append(stack.enter_context(cache.entry(key, verdict)))
+            while True:
+                chunk = p.stdout.read(CHUNK)
+                if not chunk:
+                    break
+                for f in targets:
+                    f.write(chunk)
+            if wait(p) < 0 or expired.is_set():
+                raise _Aborted()
+        return verdict
+    except _Aborted:
+        return 'TIMEOUT' if expired.is_set() else ''
+    finally:
+        if timer is not None:
+            timer.cancel()
+        _kill(p)
+        p.stdout.close()
+        wait(p)
+        if stats is not None:
+            stats['wall'] = time.monotonic() - t0
+            stats['user'] = p.rusage.ru_utime
+            stats['sys'] = p.rusage.ru_stime
+            stats['maxrss'] = p.rusage.ru_maxrss * 1024
+
+
+class Pool(object):
+    """
+    Run many strix jobs in parallel, one strix process per core.
+
+    Every job is killed after timeout seconds and limited to max_memory bytes.
+    cancel() (or leaving the with block) drops queued jobs and kills running ones.
+
+        with Pool(cache=cache) as pool:
+            for tag, verdict in pool.imap(jobs):
+                if verdict == 'UNREALIZABLE':
+                    break
+
+    >>> import strix, tempfile, time
+    >>> d = tempfile.TemporaryDirectory()
+    >>> strix.STRIX, real = os.path.join(d.name, 'strix'), strix.STRIX
+    >>> with open(strix.STRIX, 'w') as f:
+    ...     _ = f.write('#!/bin/sh\\nspec=$(cat)\\ncase "$spec" in *slow*) sleep 10;; *bad*) echo UNREALIZABLE;; *) echo REALIZABLE;; esac\\n')
+    >>> os.chmod(strix.STRIX, 0o755)
+    >>> with Pool(2, timeout=0.5, max_memory=2 ** 32) as pool:
+    ...     pool.submit('ok', ['a'], ['b']).result(), pool.submit('slow', ['a'], ['b']).result()
+    ('REALIZABLE', 'TIMEOUT')
+
+    leaving the with block after the first unrealizable job cancels the rest,
+    only 2 jobs per core were generated
+
+    >>> taken = []
+    >>> def jobs():
+    ...     for spec in ['bad'] + ['slow'] * 10:
+    ...         taken.append(spec)
+    ...         yield spec, spec, ['a'], ['b']
+    >>> t0 = time.monotonic()
+    >>> with Pool(2) as pool:
+    ...     for tag, verdict in pool.imap(jobs()):
+    ...         if verdict == 'UNREALIZABLE':
+    ...             break
+    ...     futs = [pool.submit('slow', ['a'], ['b']), pool.submit('ok', ['a'], ['b'])]
+    ...     time.sleep(0.2)
+    >>> tag, len(taken), [f.result() for f in futs], time.monotonic() - t0 < 5
+    ('bad', 4, ['CANCELLED', 'CANCELLED'], True)
+    >>> strix.STRIX = real
+    >>> d.cleanup()
+    """
+    def __init__(self, jobs=None, timeout=None, max_memory=None, cache=None, flags=FLAGS):
+        self.jobs = jobs or os.cpu_count()
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.cache = cache
+        self.flags = flags
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.jobs)
+        self.lock = threading.Lock()
+        self.procs = set()
+        self.cancelled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cancel()
+        self.executor.shutdown(wait=True)
+
+    def submit(self, spec, ins, outs, dest=None, stats=None):
+        """
+        run strix on spec (text or function writing it), the future returns the verdict.
+        dest and stats are passed to run().
+        """
+        return self.executor.submit(self._run, spec, ins, outs, dest, stats)
+
+    def imap(self, jobs):
+        """
+        run jobs, an iterable of (tag, spec, ins, outs), and yield (tag, verdict) as they finish.
+        Only a few jobs per core are generated ahead.
+        """
+        jobs = iter(jobs)
+        pending = {}
+
+        def fill():
+            for tag, spec, ins, outs in itertools.islice(jobs, 2 * self.jobs - len(pending)):
+                pending[self.submit(spec, ins, outs)] = tag
+
+        fill()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                tag = pending.pop(fut)
+                yield tag, fut.result()
+            fill()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            procs = list(self.procs)
+        for p in procs:
+            _kill(p)
+
+    def _started(self, p):
+        with self.lock:
+            self.procs.add(p)
+            if not self.cancelled:
+                return
+        _kill(p)
+
+    def _run(self, spec, ins, outs, dest, stats):
+        if self.cancelled:
+            return 'CANCELLED'
+        procs = []
+
+        def started(p):
+            procs.append(p)
+            self._started(p)
+
+        try:
+            verdict = run(spec, ins, outs, dest, self.flags, self.cache, self.timeout, self.max_memory, started, stats)
+        finally:
+            with self.lock:
+                self.procs.difference_update(procs)
+        if self.cancelled and verdict not in VERDICTS:
+            return 'CANCELLED'
+        return verdict
@@ -0,0 +1,100 @@
+"""
+Scaling sweep of the elevator spec over floors x lifts x time limit x encoding.
+
+For every grid point it builds the spec with demo4.ElevatorSpec and records
+formula size, strix wall time, cpu time, peak RSS and the number of states
+and edges of the synthesized controller.
+
+    python examples/sweep.py --floors 2,3,4,5 --lifts 1,2 --tl inf --timeout 600 --json sweep.json
+
+--encoding x,counter compares the nested X windows with the Timer counters of demo4.py for finite TL.
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import tempfile
+
+import demo4
+import kiss
+import strix
+from ltl import subterms
+
+
+def formula_size(spec):
+    """
+    number of distinct subformulas and length of the spec text
+    """
+    nodes = set()
+    for _, f in spec.assumptions + spec.guarantees:
+        nodes.update(subterms(f))
+    buf = io.StringIO()
+    demo4.write_spec(buf, spec.assumptions, spec.guarantees)
+    return len(nodes), len(buf.getvalue())
+
+
+def measure(N, M, TL, timeout=None, max_memory=None, cache=None, counter=False):
+    spec = demo4.ElevatorSpec(N, M, TL, counter)
+    n_nodes, n_chars = formula_size(spec)
+    row = {
+        'N': N, 'M': M, 'TL': None if TL == demo4.INF else TL,
+        'encoding': 'counter' if counter and TL != demo4.INF else 'x',
+        'ins': len(spec.ins), 'outs': len(spec.outs),
+        'formula_nodes': n_nodes, 'spec_chars': n_chars,
+    }
+    stats = {}
+    with tempfile.TemporaryDirectory() as d:
+        kissfname = os.path.join(d, 'out.kiss')
+        verdict = strix.run(demo4.spec_writer(spec.assumptions, spec.guarantees), spec.ins, spec.outs, kissfname,
+                            cache=cache, timeout=timeout, max_memory=max_memory, stats=stats)
+        row['verdict'] = verdict
+        row.update(stats)
+        if verdict == 'REALIZABLE':
+            graph = kiss.load_kiss(kissfname)
+            nodes = set(graph)
+            for edges in graph.values():
+                nodes.update(node_to for _, _, node_to in edges)
+            row['states'] = len(nodes)
+            row['edges'] = sum(len(edges) for edges in graph.values())
+    return row
+
+
+def parse_list(s, conv=int):
+    return [demo4.INF if v == 'inf' else conv(v) for v in s.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--floors', default='2,3,4')
+    parser.add_argument('--lifts', default='1')
+    parser.add_argument('--tl', default='inf', help='time limits, inf for eventually')
+    parser.add_argument('--encoding', default='x', help='x (nested X) and/or counter (Timer) for finite time limits')
+    parser.add_argument('--timeout', type=float, help='seconds per strix run')
+    parser.add_argument('--max-memory', type=int, help='bytes of address space per strix run, a few GB for the JVM')
+    parser.add_argument('--no-cache', action='store_true', help='always run strix (cached results have no timing)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else strix.Cache()
+    rows = []
+    encodings = args.encoding.split(',')
+    print('   N  M    TL  enc      nodes   chars  verdict         wall     user  maxrss(MB)  states  edges')
+    for N, M, TL, enc in itertools.product(parse_list(args.floors), parse_list(args.lifts), parse_list(args.tl), encodings):
+        if enc == 'counter' and TL == demo4.INF:
+            continue
+        row = measure(N, M, TL, args.timeout, args.max_memory, cache, enc == 'counter')
+        rows.append(row)
+        print('{N:4d} {M:2d} {0:>5}  {encoding:7s} {formula_nodes:6d} {spec_chars:7d}  {verdict:12s} {1:>8} {2:>8} {3:>11} {4:>7} {5:>6}'.format(
+            'inf' if row['TL'] is None else row['TL'],
+            'cached' if row['cached'] else '{0:.2f}'.format(row['wall']),
+            '' if row['cached'] else '{0:.2f}'.format(row['user']),
+            '' if row['cached'] else '{0:.1f}'.format(row['maxrss'] / 2 ** 20),
+            row.get('states', ''), row.get('edges', ''), **row), flush=True)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Choose the variable encoding of each state group by measuring strix.
+
+Every combination of demo4.ENCODINGS for the lft and move groups is
+synthesized in parallel with strix.Pool. The realizable one with the lowest
+strix wall time (--objective time) or the smallest minimized controller
+(--objective size) is recorded in demo4.encoding_file for (N, M), where
+demo4.main picks it up.
+
+    python examples/tune.py --floors 3,4,5 --lifts 1 --objective time
+
+Jobs running at the same time share the cores, use --jobs 1 for exact times.
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+
+import demo4
+import kiss
+import strix
+from minimize import minimize, count
+
+GROUPS = ('lft', 'move')
+
+
+def candidates():
+    for combo in itertools.product(demo4.ENCODINGS, repeat=len(GROUPS)):
+        yield dict(zip(GROUPS, combo))
+
+
+def cost(row, objective):
+    if row['verdict'] != 'REALIZABLE':
+        return (float('inf'),)
+    if objective == 'size':
+        return row['states'], row['edges']
+    return (row['wall'],)
+
+
+def tune(N, M, TL=demo4.INF, objective='time', jobs=None, timeout=None, max_memory=None):
+    """
+    synthesize every encoding and return the results, best first
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as d, strix.Pool(jobs, timeout, max_memory) as pool:
+        runs = []
+        for k, enc in enumerate(candidates()):
+            spec = demo4.ElevatorSpec(N, M, TL, encoding=enc)
+            sa, sg = demo4.simplify_spec(spec.assumptions, spec.guarantees, verbose=False)
+            dest = os.path.join(d, '{0}.kiss'.format(k))
+            stats = {}
+            fut = pool.submit(demo4.spec_writer(sa, sg), spec.ins, spec.outs, dest, stats)
+            runs.append((enc, spec, dest, stats, fut))
+        for enc, spec, dest, stats, fut in runs:
+            row = {'encoding': enc, 'verdict': fut.result()}
+            row.update(stats)
+            if row['verdict'] == 'REALIZABLE':
+                row['states'], row['edges'] = count(minimize(kiss.load_kiss(dest), len(spec.ins)))
+            rows.append(row)
+    rows.sort(key=lambda row: cost(row, objective))
+    return rows
+
+
+def record(N, M, TL, objective, rows, fname):
+    """
+    store the best realizable encoding of rows for (N, M) in fname
+    """
+    try:
+        with open(fname) as f:
+            choices = json.load(f)
+    except FileNotFoundError:
+        choices = {}
+    choices['{0},{1}'.format(N, M)] = {
+        'encoding': rows[0]['encoding'],
+        'objective': objective,
+        'TL': None if TL == demo4.INF else TL,
+        'results': rows,
+    }
+    with open(fname, 'w') as f:
+        json.dump(choices, f, indent=2, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--floors', default=str(demo4.N))
+    parser.add_argument('--lifts', default=str(demo4.M))
+    parser.add_argument('--tl', default='inf', help='time limit, inf for eventually')
+    parser.add_argument('--objective', choices=('time', 'size'), default='time')
+    parser.add_argument('--jobs', type=int, help='parallel strix runs (default: cores)')
+    parser.add_argument('--timeout', type=float, help='seconds per strix run')
+    parser.add_argument('--max-memory', type=int, help='bytes of address space per strix run, a few GB for the JVM')
+    parser.add_argument('--output', default=demo4.encoding_file)
+    args = parser.parse_args()
+
+    TL = demo4.INF if args.tl == 'inf' else int(args.tl)
+    for N, M in itertools.product(map(int, args.floors.split(',')), map(int, args.lifts.split(','))):
+        rows = tune(N, M, TL, args.objective, args.jobs, args.timeout, args.max_memory)
+        print('N={0} M={1}'.format(N, M))
+        for row in rows:
+            print('  lft={lft:3s} move={move:3s}  {0:12s} {1:>8} {2:>7} {3:>6}'.format(
+                row['verdict'],
+                '' if row.get('wall') is None else '{0:.2f}'.format(row['wall']),
+                row.get('states', ''), row.get('edges', ''), **row['encoding']), flush=True)
+        if rows[0]['verdict'] != 'REALIZABLE':
+            print('  no realizable encoding, nothing recorded')
+            continue
+        record(N, M, TL, args.objective, rows, args.output)
+        print('  recorded lft={lft} move={move} in {0}'.format(args.output, **rows[0]['encoding']))
+
+
+if __name__ == '__main__':
+    main()